@@ -0,0 +1,44 @@
+import base64
+import binascii
+import io
+import uuid
+
+from django.core.files.base import ContentFile
+from rest_framework import serializers
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+
+class Base64ImageField(serializers.ImageField):
+    """Изображение в виде строки base64 или data:image/...;base64,....
+
+    Pillow импортируется при первой загрузке изображения, а не при
+    запуске процесса.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Ожидается изображение в кодировке base64.',
+        'invalid_format': 'Допустимы изображения JPEG, PNG и GIF.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid_base64')
+        if ';base64,' in data:
+            data = data.split(';base64,', 1)[1]
+        try:
+            decoded = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            self.fail('invalid_base64')
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            image_format = Image.open(io.BytesIO(decoded)).format
+        except (UnidentifiedImageError, OSError):
+            self.fail('invalid_image')
+        extension = EXTENSIONS.get(image_format)
+        if extension is None:
+            self.fail('invalid_format')
+        return super().to_internal_value(
+            ContentFile(decoded, name=f'{uuid.uuid4()}.{extension}')
+        )
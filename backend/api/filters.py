@@ -1,4 +1,4 @@
-from app.models import Ingredient
+from app.models import Ingredient, Recipe
 from django_filters import rest_framework as filters
 
 
@@ -11,3 +11,33 @@ class IngredientFilter(filters.FilterSet):
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+
+class RecipeFilter(filters.FilterSet):
+    """Фильтры по времени приготовления и сортировка списка рецептов.
+
+    Каждой сортировке соответствует составной индекс Recipe с тем же
+    порядком полей, поэтому страница читается по индексу без сортировки
+    всей таблицы.
+    """
+    ORDERINGS = {
+        '-pub_date': ('-pub_date', '-id'),
+        'cooking_time': ('cooking_time', '-pub_date', '-id'),
+        'popular': ('-popularity', '-pub_date', '-id'),
+    }
+
+    cooking_time_min = filters.NumberFilter(field_name='cooking_time',
+                                            lookup_expr='gte')
+    cooking_time_max = filters.NumberFilter(field_name='cooking_time',
+                                            lookup_expr='lte')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='order',
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('author__id',)
+
+    def order(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class FavoritesPagination(CursorPagination):
+    ordering = ('-added_at', '-id')
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class RecipePagination(PageNumberPagination):
+    page_size_query_param = 'limit'
+    max_page_size = 100
@@ -1,9 +1,18 @@
-from app.models import CountIngredients, Ingredient, Recipe, Tag
-from drf_extra_fields.fields import Base64ImageField
+import hashlib
+
+from app import fragments
+from app.models import (CountIngredients, ExportJob, Favorites, Follow,
+                        Ingredient, Recipe, ShopingCart, Tag)
+from app.thumbnails import thumbnail_url
+from django.db.models import Manager, Prefetch, prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from users.models import User
 from users.serializers import UserSerializer
 
+from .fields import Base64ImageField
+
 
 class IngredientSerializer(serializers.ModelSerializer):
 
@@ -38,7 +47,61 @@ class CountIngredientsSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+def sparse_fields(request, names):
+    """Поля из names, которые клиент запросил через ?fields= и не
+    исключил через ?omit=; для запросов на запись — все поля"""
+    names = list(names)
+    if request is None or request.method != 'GET':
+        return names
+    fields = request.query_params.get('fields')
+    omit = set(request.query_params.get('omit', '').split(','))
+    if fields:
+        fields = set(fields.split(','))
+        names = [name for name in names if name in fields]
+    return [name for name in names if name not in omit]
+
+
+class SparseFieldsMixin:
+    """Убирает поля, не запрошенные через ?fields= и ?omit="""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = sparse_fields(self.context.get('request'), self.fields)
+        for name in set(self.fields) - set(requested):
+            self.fields.pop(name)
+
+
+def recipe_prefetches(fields):
+    """Связи рецепта, которые нужно загрузить для полей fields"""
+    lookups = []
+    if 'tags' in fields:
+        lookups.append('tags')
+    if 'ingredients' in fields:
+        lookups.append(Prefetch(
+            'amount_ingredient',
+            CountIngredients.objects.select_related('ingredient')
+        ))
+    return lookups
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов из кэша фрагментов app.fragments; связи
+    загружаются только для рецептов, которых нет в кэше"""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        public = fragments.get_many(recipes, self.child.fragment_variant(),
+                                    self.render)
+        return [self.child.personalize(fragment, recipe)
+                for fragment, recipe in zip(public, recipes)]
+
+    def render(self, recipes):
+        prefetch_related_objects(recipes,
+                                 *recipe_prefetches(self.child.fields))
+        return [self.child.public(recipe) for recipe in recipes]
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     image = Base64ImageField(required=True, allow_null=True)
     author = UserSerializer(read_only=True)
     ingredients = CountIngredientsSerializer(
@@ -118,6 +181,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'author': {'read_only': True},
         }
+        list_serializer_class = RecipeListSerializer
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('amount_ingredient')
@@ -145,7 +209,6 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         tags_data = validated_data.pop('tags')
         instance.tags.set(tags_data)
-        instance.save()
         ingredients_data = validated_data.pop('amount_ingredient')
         recipe = Recipe.objects.get(pk=instance.id)
         objs = [
@@ -158,24 +221,147 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
         CountIngredients.objects.filter(recipe=recipe).delete()
         CountIngredients.objects.bulk_create(objs)
+        # Сохраняем последним: новый updated_at означает, что теги и
+        # ингредиенты уже записаны (app.fragments)
+        instance.save()
         return instance
 
+    PERSONAL_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_subscribed'):
+            instance.author.subscribed = instance.author_subscribed
+        return super().to_representation(instance)
+
+    def fragment_variant(self):
+        """Набор полей и адрес сайта, от которых зависит фрагмент"""
+        request = self.context.get('request')
+        signature = '|'.join((
+            type(self).__name__, ','.join(self.fields),
+            request.build_absolute_uri('/') if request else ''
+        ))
+        return hashlib.sha1(signature.encode()).hexdigest()[:16]
+
+    def public(self, instance):
+        """Представление без признаков пользователя"""
+        data = self.to_representation(instance)
+        for name in self.PERSONAL_FIELDS:
+            if name in data:
+                data[name] = None
+        if 'is_subscribed' in (data.get('author') or {}):
+            data['author']['is_subscribed'] = None
+        return data
+
+    def personalize(self, data, instance):
+        """Подставить в публичное представление признаки пользователя"""
+        if hasattr(instance, 'author_subscribed'):
+            instance.author.subscribed = instance.author_subscribed
+        for name in self.PERSONAL_FIELDS:
+            if name in data:
+                data[name] = self.fields[name].to_representation(instance)
+        if 'is_subscribed' in (data.get('author') or {}):
+            data['author']['is_subscribed'] = (
+                self.fields['author'].fields['is_subscribed']
+                .to_representation(instance.author)
+            )
+        return data
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
         request = self.context["request"]
         user = request.user
         return (user.is_authenticated
                 and user.favorite_user.filter(recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'in_shopping_cart'):
+            return obj.in_shopping_cart
         request = self.context["request"]
         user = request.user
         return (user.is_authenticated
                 and user.buyer.filter(recipe=obj).exists())
 
 
+class RecipeAuthorSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name')
+
+
+class RecipeCardSerializer(RecipeSerializer):
+    """Рецепт в списках: без описания и ингредиентов, автор кратко"""
+    author = RecipeAuthorSerializer(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = ('id',
+                  'tags',
+                  'author',
+                  'is_favorited',
+                  'is_in_shopping_cart',
+                  'name',
+                  'image',
+                  'cooking_time',
+                  )
+
+
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     image = Base64ImageField(allow_null=False)
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class FavoriteSerializer(serializers.ModelSerializer):
+    """Рецепт из избранного в коротком виде с уменьшенным изображением"""
+    id = serializers.ReadOnlyField(source='recipe.id')
+    name = serializers.ReadOnlyField(source='recipe.name')
+    image = serializers.SerializerMethodField()
+    cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
+
+    class Meta:
+        model = Favorites
+        fields = ('id', 'name', 'image', 'cooking_time', 'added_at')
+
+    def get_image(self, obj):
+        url = thumbnail_url(obj.recipe.image)
+        request = self.context.get('request')
+        if url and request:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class CartItemSerializer(FavoriteSerializer):
+
+    class Meta(FavoriteSerializer.Meta):
+        model = ShopingCart
+
+
+class FollowItemSerializer(serializers.ModelSerializer):
+    """Подписка в коротком виде: автор и дата подписки"""
+    id = serializers.ReadOnlyField(source='author.id')
+    username = serializers.ReadOnlyField(source='author.username')
+    first_name = serializers.ReadOnlyField(source='author.first_name')
+    last_name = serializers.ReadOnlyField(source='author.last_name')
+
+    class Meta:
+        model = Follow
+        fields = ('id', 'username', 'first_name', 'last_name', 'added_at')
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'kind', 'status', 'error', 'created_at',
+                  'finished_at', 'download')
+
+    def get_download(self, obj):
+        if obj.status != ExportJob.DONE:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('exports-download', args=(obj.pk,))
+        )
@@ -0,0 +1,129 @@
+"""Проверки API: N+1 запросы на основных списках и разбор параметров.
+
+Запуск: python manage.py test. Кэши заменены локальными, чтобы
+фрагменты рецептов из прошлых запусков не подменяли данные теста, а
+изображения пишутся во временный каталог.
+"""
+import io
+import shutil
+import tempfile
+
+from app.models import Favorites, Follow, Recipe, ShopingCart
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from foodgram.nplusone import NPlusOneError, detect_n_plus_one
+from rest_framework.test import APIClient
+from users.models import User
+
+RECIPES = 10
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-tests-')
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-default',
+    },
+    'state': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-state',
+    },
+}
+
+
+def png():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4)).save(buffer, format='PNG')
+    return ContentFile(buffer.getvalue())
+
+
+def create_user(name):
+    return User.objects.create(username=name, email=f'{name}@example.com',
+                               first_name=name, last_name=name)
+
+
+@override_settings(CACHES=LOCAL_CACHES, MEDIA_ROOT=MEDIA_ROOT)
+class APITestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        image = default_storage.save('app/images/test.png', png())
+        for number in range(RECIPES):
+            author = create_user(f'author{number}')
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='',
+                cooking_time=5, image=image
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            Favorites.objects.create(user=cls.user, recipe=recipe)
+            ShopingCart.objects.create(user=cls.user, recipe=recipe)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class DetectNPlusOneTests(APITestCase):
+
+    def test_query_per_row_is_reported(self):
+        with self.assertRaises(NPlusOneError) as error:
+            with detect_n_plus_one():
+                for recipe in Recipe.objects.all():
+                    recipe.author.username
+        self.assertIn('api/tests.py', str(error.exception))
+
+    def test_joined_query_passes(self):
+        with detect_n_plus_one() as detector:
+            for recipe in Recipe.objects.select_related('author'):
+                recipe.author.username
+        self.assertEqual(detector.problems, [])
+
+    def test_not_strict_only_collects(self):
+        with detect_n_plus_one(strict=False) as detector:
+            for recipe in Recipe.objects.all():
+                recipe.author.username
+        self.assertEqual(len(detector.problems), 1)
+
+
+class ListQueriesTests(APITestCase):
+    """Списки рецептов, лента и избранное не выполняют запрос на
+    каждую строку"""
+
+    urls = (
+        f'/api/recipes/?limit={RECIPES}',
+        f'/api/recipes/?limit={RECIPES}&is_favorited=1',
+        f'/api/recipes/?limit={RECIPES}&is_in_shopping_cart=1',
+        f'/api/recipes/feed/?limit={RECIPES}',
+        f'/api/favorites/?limit={RECIPES}',
+    )
+
+    def test_lists(self):
+        for url in self.urls:
+            with self.subTest(url=url), detect_n_plus_one():
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class FavoritesSinceTests(APITestCase):
+
+    def test_aware_date(self):
+        response = self.client.get('/api/favorites/',
+                                   {'since': '2000-01-01T00:00:00+00:00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), RECIPES)
+
+    def test_invalid_dates(self):
+        for since in ('2023-02-30T00:00:00+00:00', '2023-01-01T00:00:00',
+                      'вчера'):
+            with self.subTest(since=since):
+                response = self.client.get('/api/favorites/',
+                                           {'since': since})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,94 @@
+"""Ограничение частоты запросов по алгоритму token bucket.
+
+У каждого пользователя (анонимного — у каждого IP) есть корзина на
+capacity жетонов, которая пополняется со скоростью rate жетонов в
+секунду. Запрос списывает столько жетонов, сколько стоит его обработка:
+представление может задать цену методом get_throttle_cost.
+
+Состояние корзины хранится в кэше state как одно число — момент, когда
+корзина снова станет полной (GCRA), и обновляется под блокировкой через
+cache.add. Блокировка атомарна только для кэшей с атомарным add
+(memcached, redis, база данных). С файловым кэшем, который используется
+при разработке, параллельные запросы из разных процессов могут
+списывать жетоны одновременно, и ограничение выполняется лишь
+приблизительно.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+LOCK_ATTEMPTS = 20
+LOCK_WAIT = 0.005
+
+
+class TokenBucketThrottle(BaseThrottle):
+
+    def allow_request(self, request, view):
+        if request.user and request.user.is_authenticated:
+            scope, ident = 'user', request.user.pk
+        else:
+            scope, ident = 'anon', self.get_ident(request)
+        self.capacity, rate = settings.THROTTLE_BUCKETS[scope]
+        self.interval = 1 / rate
+        get_cost = getattr(view, 'get_throttle_cost', None)
+        cost = min(get_cost() if get_cost else 1, self.capacity)
+        key = f'throttle:{scope}:{ident}'
+        allowed, full_at = self.take(key, cost)
+        now = time.time()
+        self.wait_time = (
+            None if allowed
+            else full_at - now - (self.capacity - cost) * self.interval
+        )
+        request._request.ratelimit = (
+            self.capacity,
+            max(int(self.capacity - (full_at - now) / self.interval), 0),
+            math.ceil(full_at - now),
+        )
+        return allowed
+
+    def take(self, key, cost):
+        """Списать cost жетонов; возвращает (разрешено, момент, когда
+        корзина станет полной)"""
+        cache = caches['state']
+        lock = key + ':lock'
+        for _ in range(LOCK_ATTEMPTS):
+            if cache.add(lock, 1, timeout=1):
+                break
+            time.sleep(LOCK_WAIT)
+        else:
+            # Не дождались блокировки: пропускаем запрос, но не списываем
+            return True, cache.get(key) or time.time()
+        try:
+            now = time.time()
+            full_at = max(cache.get(key) or now, now)
+            new_full_at = full_at + cost * self.interval
+            if new_full_at - now > self.capacity * self.interval:
+                return False, full_at
+            cache.set(key, new_full_at, timeout=math.ceil(new_full_at - now))
+            return True, new_full_at
+        finally:
+            cache.delete(lock)
+
+    def wait(self):
+        return self.wait_time
+
+
+class RateLimitMiddleware:
+    """Добавляет заголовки RateLimit-* к ответам, прошедшим через
+    TokenBucketThrottle"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        ratelimit = getattr(request, 'ratelimit', None)
+        if ratelimit:
+            limit, remaining, reset = ratelimit
+            response['RateLimit-Limit'] = limit
+            response['RateLimit-Remaining'] = remaining
+            response['RateLimit-Reset'] = reset
+        return response
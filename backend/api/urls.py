@@ -3,7 +3,8 @@ from django.conf.urls.static import static
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, get_favorite
+from .views import (ExportJobViewSet, IngredientViewSet, RecipeViewSet,
+                    SyncViewSet, TagViewSet, get_favorite)
 
 router = DefaultRouter()
 router.register('ingredients', IngredientViewSet, basename='ingredients')
@@ -17,6 +18,8 @@ router.register(r"tags/(?P<tag_id>\d+)",
                 basename="tags"
                 )
 router.register('recipes', RecipeViewSet, basename="recipes")
+router.register('exports', ExportJobViewSet, basename='exports')
+router.register('sync', SyncViewSet, basename='sync')
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -1,23 +1,70 @@
-from app.models import (CountIngredients, Favorites, Ingredient, Recipe,
-                        ShopingCart, Tag)
+import math
+
+from app import catalogue, exports, facets, feed, sync
+from app.models import (ExportJob, Favorites, Follow, Ingredient, Recipe,
+                        ShopingCart, Tag, Tombstone)
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import Exists, OuterRef
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django_filters.rest_framework import DjangoFilterBackend
+from foodgram.compression import cached_response
 from rest_framework import status, viewsets
 from rest_framework.decorators import action, api_view
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
-from .filters import IngredientFilter
+from .filters import IngredientFilter, RecipeFilter
+from .pagination import FavoritesPagination, RecipePagination
 from .permissions import IsUserOwner
-from .serializers import (IngredientSerializer, RecipeMinifiedSerializer,
-                          RecipeSerializer, TagSerializer)
+from .serializers import (CartItemSerializer, ExportJobSerializer,
+                          FavoriteSerializer, FollowItemSerializer,
+                          IngredientSerializer, RecipeCardSerializer,
+                          RecipeMinifiedSerializer, RecipeSerializer,
+                          TagSerializer, recipe_prefetches)
 from .utils import file_creation
 
 User = get_user_model()
 
+FACET_PARAMS = ('author', 'author__id', 'is_favorited', 'is_in_shopping_cart',
+                'cooking_time_min', 'cooking_time_max')
+# Действия со списками рецептов: карточки из кэша фрагментов
+LIST_ACTIONS = ('list', 'trending', 'feed')
+
+
+def load_recipe_fields(queryset, fields, user, prefetch=True):
+    """Загрузить одним запросом на связь только то, что попадет
+    в ответ с полями fields; без prefetch теги и ингредиенты загрузит
+    RecipeListSerializer для рецептов, которых нет в кэше фрагментов"""
+    if 'text' not in fields:
+        queryset = queryset.defer('text')
+    if 'author' in fields:
+        queryset = queryset.select_related('author')
+        author_fields = getattr(fields['author'], 'fields', {})
+        if 'is_subscribed' in author_fields and user.is_authenticated:
+            queryset = queryset.annotate(author_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('author'))
+            ))
+    if prefetch:
+        queryset = queryset.prefetch_related(*recipe_prefetches(fields))
+    if 'is_favorited' in fields and user.is_authenticated:
+        queryset = queryset.annotate(favorited=Exists(
+            Favorites.objects.filter(user=user, recipe=OuterRef('pk'))
+        ))
+    if 'is_in_shopping_cart' in fields and user.is_authenticated:
+        queryset = queryset.annotate(in_shopping_cart=Exists(
+            ShopingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+        ))
+    return queryset
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
@@ -27,6 +74,13 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return catalogue.response(request, lambda: JSONRenderer().render(
+            self.get_serializer(self.get_queryset(), many=True).data
+        ))
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
@@ -39,26 +93,62 @@ class RecipeViewSet(viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, IsUserOwner,)
     filter_backends = (DjangoFilterBackend, )
-    filterset_fields = ('author__id', )
+    filterset_class = RecipeFilter
+    pagination_class = RecipePagination
     search_fields = ('^name')
+    # Цена запросов в жетонах api.throttling.TokenBucketThrottle; списки
+    # стоят list_item_cost за каждый рецепт страницы независимо от
+    # фильтров и ?fields=/?omit=
+    throttle_costs = {
+        'create': 5,
+        'update': 5,
+        'partial_update': 5,
+        'getfile': 10,
+    }
+    list_item_cost = 0.5
+
+    def get_throttle_cost(self):
+        if self.action in LIST_ACTIONS:
+            size = (self.paginator.get_page_size(self.request)
+                    if self.paginator else api_settings.PAGE_SIZE)
+            return max(math.ceil(size * self.list_item_cost), 1)
+        return self.throttle_costs.get(self.action, 1)
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = Recipe.objects.all()
+        queryset = self.filter_recipes(Recipe.objects.all())
         tags = self.request.query_params.getlist('tags')
-        author = self.request.query_params.getlist('author')
         if tags:
-            queryset = Recipe.objects.filter(tags__slug__in=tags).distinct()
-        if self.request.query_params.get('is_favorited'):
-            queryset = queryset.filter(
-                pk__in=Favorites.objects.filter(user=user)
-                .values('recipe')
-            )
-        if self.request.query_params.get('is_in_shopping_cart'):
-            queryset = queryset.filter(
-                pk__in=ShopingCart.objects.filter(user=user)
-                .values('recipe')
-            )
+            queryset = queryset.filter(tags__slug__in=tags).distinct()
+        return self.load_fields(queryset)
+
+    def get_serializer_class(self):
+        if (self.action in LIST_ACTIONS
+                and 'fields' not in self.request.query_params):
+            return RecipeCardSerializer
+        return RecipeSerializer
+
+    def load_fields(self, queryset):
+        if self.request.method != 'GET':
+            return queryset
+        return load_recipe_fields(queryset, self.get_serializer().fields,
+                                  self.request.user,
+                                  prefetch=self.action not in LIST_ACTIONS)
+
+    def filter_recipes(self, queryset):
+        """Фильтры по автору, избранному и корзине, кроме тегов"""
+        user = self.request.user
+        author = self.request.query_params.getlist('author')
+        if user.is_authenticated:
+            if self.request.query_params.get('is_favorited'):
+                queryset = queryset.filter(
+                    pk__in=Favorites.objects.filter(user=user)
+                    .values('recipe')
+                )
+            if self.request.query_params.get('is_in_shopping_cart'):
+                queryset = queryset.filter(
+                    pk__in=ShopingCart.objects.filter(user=user)
+                    .values('recipe')
+                )
         if author:
             queryset = queryset.filter(author__pk__in=author)
         return queryset
@@ -67,7 +157,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = self.request.user
         serializer.save(author=user)
         user.recipe_count = Recipe.objects.filter(author=user).count()
-        user.save()
+        user.save(update_fields=['recipe_count'])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def perform_update(self, serializer):
@@ -118,26 +208,195 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=(AllowAny,)
+            )
+    def trending(self, request):
+        """Рецепты по убыванию популярности с учетом затухания"""
+        queryset = self.load_fields(
+            Recipe.objects.filter(popularity__gt=0)
+            .order_by(*RecipeFilter.ORDERINGS['popular'])
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=(AllowAny,)
+            )
+    def facets(self, request):
+        """Число рецептов по каждому тегу при текущих фильтрах"""
+        params = {name: sorted(values) for name, values
+                  in request.query_params.lists()
+                  if name in FACET_PARAMS}
+        personal = request.user.is_authenticated and (
+            params.keys() & {'is_favorited', 'is_in_shopping_cart'}
+        )
+        user_id = request.user.pk if personal else None
+        queryset = self.filter_queryset(self.filter_recipes(
+            Recipe.objects.all()
+        ))
+        return cached_response(
+            request, facets.cache_key(params, user_id),
+            lambda: JSONRenderer().render(facets.facets(queryset)),
+            facets.timeout(params, user_id)
+        )
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=(IsAuthenticated,)
+            )
+    def feed(self, request):
+        """Новые рецепты авторов из подписок с курсорной пагинацией"""
+        position = None
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            position = feed.decode_cursor(cursor)
+            if position is None:
+                return Response({'cursor': ['Некорректный курсор']},
+                                status=status.HTTP_400_BAD_REQUEST)
+        recipes, next_cursor = feed.page(
+            request.user, position, self.paginator.get_page_size(request),
+            self.load_fields(Recipe.objects.all())
+        )
+        serializer = self.get_serializer(recipes, many=True)
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(request.build_absolute_uri(),
+                                           'cursor', next_cursor)
+        return Response({'next': next_url,
+                         'previous': None,
+                         'results': serializer.data})
+
     @action(detail=False,
             methods=['get'],
             url_path='download_shopping_cart',
             permission_classes=(IsAuthenticated,)
             )
     def getfile(self, request):
-        shoping_carts = ShopingCart.objects.filter(
-            user=request.user
+        """Список покупок; с ?async=1 или Prefer: respond-async файл
+        формируется в фоне, а ответ содержит адрес задания"""
+        if (request.query_params.get('async')
+                or 'respond-async' in request.headers.get('Prefer', '')):
+            job = exports.enqueue(request.user, ExportJob.SHOPPING_LIST)
+            serializer = ExportJobSerializer(job,
+                                             context={'request': request})
+            location = reverse('exports-detail', args=(job.pk,))
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED,
+                            headers={'Location': location})
+        return file_creation(exports.shopping_list(request.user))
+
+
+class ExportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Состояние фоновых выгрузок пользователя и скачивание результата"""
+    serializer_class = ExportJobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportJob.DONE:
+            return Response({'status': job.status},
+                            status=status.HTTP_409_CONFLICT)
+        name = job.file.name.rsplit('/', 1)[-1]
+        if not settings.EXPORT_X_ACCEL:
+            return FileResponse(job.file.open('rb'), as_attachment=True,
+                                filename=name)
+        response = HttpResponse(content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        response['X-Accel-Redirect'] = (settings.EXPORT_ACCEL_PREFIX
+                                        + job.file.name)
+        return response
+
+
+class SyncViewSet(viewsets.GenericViewSet):
+    """Изменения после токена ?since= для офлайн-клиентов (app.sync):
+    измененные строки, id удаленных и токен следующего запроса"""
+    permission_classes = (IsAuthenticated,)
+
+    def changes(self, queryset, time_field, kind, serializer_class,
+                user=None):
+        since = self.request.query_params.get('since')
+        position = sync.decode_token(since) if since else None
+        if since and position is None:
+            return Response({'since': ['Некорректный токен']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        changed, deleted, token, has_more, reset = sync.changes(
+            queryset, time_field,
+            Tombstone.objects.filter(kind=kind, user=user),
+            position, settings.SYNC_PAGE_SIZE
+        )
+        objects = queryset.in_bulk(changed)
+        serializer = serializer_class(
+            [objects[pk] for pk in changed if pk in objects], many=True,
+            context=self.get_serializer_context()
+        )
+        return Response({'changed': serializer.data, 'deleted': deleted,
+                         'since': token, 'has_more': has_more,
+                         'reset': reset})
+
+    @action(detail=False, methods=['get'], permission_classes=(AllowAny,))
+    def recipes(self, request):
+        queryset = load_recipe_fields(Recipe.objects.all(),
+                                      RecipeSerializer().fields, request.user,
+                                      prefetch=False)
+        return self.changes(queryset, 'updated_at', Tombstone.RECIPE,
+                            RecipeSerializer)
+
+    @action(detail=False, methods=['get'])
+    def favorites(self, request):
+        return self.changes(
+            Favorites.objects.filter(user=request.user)
+            .select_related('recipe'),
+            'added_at', Tombstone.FAVORITE, FavoriteSerializer, request.user
+        )
+
+    @action(detail=False, methods=['get'])
+    def shopping_cart(self, request):
+        return self.changes(
+            ShopingCart.objects.filter(user=request.user)
+            .select_related('recipe'),
+            'added_at', Tombstone.SHOPPING_CART, CartItemSerializer,
+            request.user
+        )
+
+    @action(detail=False, methods=['get'])
+    def follows(self, request):
+        return self.changes(
+            Follow.objects.filter(user=request.user)
+            .select_related('author'),
+            'added_at', Tombstone.FOLLOW, FollowItemSerializer, request.user
         )
-        recipes = [i.recipe.id for i in shoping_carts]
-        shoping_list = (CountIngredients.objects.filter(recipe__in=recipes)
-                        .order_by('ingredient')
-                        .values('ingredient')
-                        .annotate(count=Sum("amount"))
-                        )
-        return file_creation(shoping_list)
 
 
 @api_view(["GET"])
 def get_favorite(request):
-    quryset = [i.recipe for i in Favorites.objects.filter(user=request.user)]
-    serializer = RecipeMinifiedSerializer(quryset, many=True)
-    return Response(serializer.data)
+    """Избранное пользователя с курсорной пагинацией;
+    ?since= возвращает только добавленное после указанного момента"""
+    queryset = (Favorites.objects.filter(user=request.user)
+                .select_related('recipe')
+                .only('id', 'added_at', 'recipe__id', 'recipe__name',
+                      'recipe__image', 'recipe__cooking_time'))
+    since = request.query_params.get('since')
+    if since:
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            since = None
+        if since is None or timezone.is_naive(since):
+            return Response(
+                {'since': ['Ожидается дата с часовым поясом в формате '
+                           'ISO 8601']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = queryset.filter(added_at__gt=since)
+    paginator = FavoritesPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = FavoriteSerializer(page, many=True,
+                                    context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
@@ -1,7 +1,39 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
+from . import fragments
 from .models import (CountIngredients, Favorites, Follow, Ingredient, Recipe,
                      ShopingCart, Tag)
+from .sql import count_related
+
+ESTIMATE_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для больших таблиц без фильтров берет число строк из статистики
+    PostgreSQL, а не из COUNT(*) по всей таблице"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATE_THRESHOLD:
+                return int(row[0])
+        return queryset.values('pk').order_by().count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Ingredient)
@@ -12,33 +44,61 @@ class IngredientAdmin(admin.ModelAdmin):
 
 class CountIngredientsAdmin(admin.TabularInline):
     model = CountIngredients
+    autocomplete_fields = ('ingredient',)
+    extra = 1
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'pub_date')
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'author', 'pub_date', 'favorites_count')
+    list_select_related = ('author',)
     inlines = (CountIngredientsAdmin,)
     search_fields = ('name',)
-    list_filter = ('author', 'tags',)
+    list_filter = ('tags',)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorites_count=count_related(Favorites, 'recipe')
+        )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
+    def favorites_count(self, obj):
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Ингредиенты сохраняются после рецепта: обновляем updated_at,
+        # чтобы не остался фрагмент со старыми (app.fragments)
+        fragments.touch(Recipe.objects.filter(pk=form.instance.pk))
+
 
 admin.site.register(Tag)
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'author',)
-    list_filter = ('user', 'author',)
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
 
 
 @admin.register(Favorites)
-class FavoritesAdmin(admin.ModelAdmin):
+class FavoritesAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'recipe',)
-    list_filter = ('user',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShopingCart)
-class ShopingCart(admin.ModelAdmin):
+class ShopingCartAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'recipe',)
-    list_filter = ('user',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
@@ -5,3 +5,10 @@ class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from foodgram import slow_queries
+
+        from . import signals  # noqa: F401
+
+        slow_queries.install()
@@ -0,0 +1,92 @@
+"""Пакетная вставка больших объемов данных"""
+import io
+
+from django.db import connection
+from django.utils import timezone
+
+
+def fill_dates(batch):
+    """Проставить текущее время в пустые поля auto_now и auto_now_add"""
+    now = timezone.now()
+    dates = [field.attname for field in batch[0]._meta.concrete_fields
+             if getattr(field, 'auto_now', False)
+             or getattr(field, 'auto_now_add', False)]
+    for obj in batch:
+        for attname in dates:
+            if getattr(obj, attname) is None:
+                setattr(obj, attname, now)
+
+
+def _fields(model, batch):
+    return [field for field in model._meta.concrete_fields
+            if not (field.primary_key
+                    and getattr(batch[0], field.attname) is None)]
+
+
+def _copy_value(value):
+    """Значение для COPY в текстовом формате: NULL — \\N, поэтому
+    пустая строка остается пустой строкой"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def insert(model, batch):
+    """Вставить объекты с уже заданными датами.
+
+    bulk_create подменяет даты auto_now_add текущим временем, а
+    отключать это у полей модели нельзя: поля общие для всех потоков
+    процесса. Вставка raw, как при загрузке фикстур, берет значения из
+    объектов как есть. id созданных объектов не возвращаются.
+    """
+    fields = _fields(model, batch)
+    size = max(connection.ops.bulk_batch_size(fields, batch), 1)
+    for start in range(0, len(batch), size):
+        model._base_manager._insert(batch[start:start + size],
+                                    fields=fields, raw=True)
+    return len(batch)
+
+
+class Writer:
+    """Пакетная вставка через insert или COPY на PostgreSQL"""
+
+    def __init__(self, batch_size, use_copy):
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+
+    def write(self, model, objects):
+        count = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                count += self.flush(model, batch)
+                batch = []
+        if batch:
+            count += self.flush(model, batch)
+        return count
+
+    def flush(self, model, batch):
+        fill_dates(batch)
+        if not self.use_copy:
+            return insert(model, batch)
+        fields = _fields(model, batch)
+        buffer = io.StringIO()
+        for obj in batch:
+            buffer.write('\t'.join(
+                _copy_value(field.get_db_prep_save(
+                    getattr(obj, field.attname), connection
+                ))
+                for field in fields
+            ) + '\n')
+        buffer.seek(0)
+        columns = ', '.join(connection.ops.quote_name(field.column)
+                            for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+                f'({columns}) FROM STDIN',
+                buffer
+            )
+        return len(batch)
@@ -0,0 +1,75 @@
+"""Готовый JSON полного справочника ингредиентов.
+
+Список без фильтра сериализуется один раз на процесс и хранится в
+памяти вместе со сжатыми вариантами. Версия справочника лежит в общем
+кэше: сигналы меняют ее после коммита изменений Ingredient, и каждый
+процесс пересобирает свою копию при первом запросе с новой версией.
+Версия же служит ETag ответа.
+"""
+import threading
+
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from foodgram.compression import brotli, compress, negotiate
+
+from . import generations
+
+VERSION_KEY = 'ingredients:version'
+
+_lock = threading.Lock()
+_catalogue = None
+
+
+def invalidate():
+    transaction.on_commit(lambda: generations.bump(VERSION_KEY))
+
+
+def version():
+    return generations.current(VERSION_KEY)
+
+
+class Catalogue:
+
+    def __init__(self, version, body):
+        self.version = version
+        self.bodies = {None: body, 'gzip': compress(body, 'gzip')}
+        if brotli():
+            self.bodies['br'] = compress(body, 'br')
+
+    def etag(self, encoding):
+        return f'"ingredients-{self.version}-{encoding or "identity"}"'
+
+
+def get(render):
+    """Справочник текущей версии; render() возвращает JSON в байтах"""
+    global _catalogue
+    current = version()
+    catalogue = _catalogue
+    if catalogue is None or catalogue.version != current:
+        with _lock:
+            if _catalogue is None or _catalogue.version != current:
+                _catalogue = Catalogue(current, render())
+            catalogue = _catalogue
+    return catalogue
+
+
+def response(request, render):
+    catalogue = get(render)
+    encoding = negotiate(request)
+    etag = catalogue.etag(encoding)
+    matches = {tag.replace('W/', '', 1) for tag in parse_etags(
+        request.META.get('HTTP_IF_NONE_MATCH', '')
+    )}
+    if etag in matches or '*' in matches:
+        result = HttpResponseNotModified()
+    else:
+        result = HttpResponse(catalogue.bodies[encoding],
+                              content_type='application/json')
+        if encoding:
+            result['Content-Encoding'] = encoding
+    result['ETag'] = etag
+    patch_vary_headers(result, ('Accept-Encoding',))
+    patch_cache_control(result, no_cache=True)
+    return result
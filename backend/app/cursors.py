@@ -0,0 +1,33 @@
+"""Непрозрачные курсоры постраничной выдачи.
+
+Позиция — время с часовым поясом и несколько целых чисел; курсор — их
+строка в base64. Общий формат у ленты подписок (app.feed) и
+синхронизации (app.sync), поэтому некорректные курсоры в обоих
+отклоняются одинаково.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.utils import timezone
+
+
+def encode(when, *numbers):
+    value = '|'.join([when.isoformat(), *map(str, numbers)])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode(cursor, size):
+    """Позиция (время, size целых) или None, если курсор некорректен
+    или время в нем без часового пояса"""
+    try:
+        when, *numbers = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        )
+        when = datetime.fromisoformat(when)
+        numbers = [int(number) for number in numbers]
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if len(numbers) != size or timezone.is_naive(when):
+        return None
+    return (when, *numbers)
@@ -0,0 +1,124 @@
+"""Фоновое формирование файлов для скачивания.
+
+Задание записывается в таблицу ExportJob. После коммита его берет
+пул потоков процесса (EXPORT_WORKER_THREADS) или отдельный процесс
+run_export_worker. Готовый файл лежит в media/exports/, клиент
+скачивает его через nginx (X-Accel-Redirect), не занимая воркер Django.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import CountIngredients, ExportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def shopping_list(user):
+    """Ингредиенты всех рецептов из корзины одним запросом"""
+    rows = (CountIngredients.objects.filter(recipe__shoping_cart__user=user)
+            .order_by('ingredient')
+            .values('ingredient', 'ingredient__name',
+                    'ingredient__measurement_unit')
+            .annotate(count=Sum('amount')))
+    return ''.join(
+        f'{row["ingredient__name"]} '
+        f'({row["ingredient__measurement_unit"]}) - {row["count"]}\n'
+        for row in rows
+    )
+
+
+EXPORTERS = {
+    ExportJob.SHOPPING_LIST: (shopping_list, 'txt'),
+}
+
+
+def enqueue(user, kind):
+    job = ExportJob.objects.create(user=user, kind=kind)
+    if settings.EXPORT_WORKER_THREADS:
+        transaction.on_commit(lambda: executor().submit(run, job.pk))
+    return job
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.EXPORT_WORKER_THREADS,
+            thread_name_prefix='export'
+        )
+    return _executor
+
+
+def claim(job_id):
+    """Взять задание в работу; False, если его уже взял другой воркер"""
+    return bool(ExportJob.objects.filter(
+        pk=job_id, status=ExportJob.PENDING
+    ).update(status=ExportJob.RUNNING, started_at=timezone.now()))
+
+
+def run(job_id):
+    try:
+        if claim(job_id):
+            execute(ExportJob.objects.select_related('user').get(pk=job_id))
+    finally:
+        connection.close()
+
+
+def execute(job):
+    export, extension = EXPORTERS[job.kind]
+    try:
+        content = export(job.user)
+        job.file.save(f'{job.pk}-{uuid.uuid4().hex}.{extension}',
+                      ContentFile(content.encode()), save=False)
+        job.status = ExportJob.DONE
+    except Exception as error:
+        logger.exception('Выгрузка %s не удалась', job.pk)
+        job.status = ExportJob.FAILED
+        job.error = str(error)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'error', 'finished_at'])
+
+
+def run_pending(limit=100):
+    """Выполнить накопившиеся задания; возвращает их число"""
+    done = 0
+    pending = (ExportJob.objects.filter(status=ExportJob.PENDING)
+               .order_by('created_at').values_list('pk', flat=True)[:limit])
+    for job_id in pending:
+        if claim(job_id):
+            execute(ExportJob.objects.select_related('user').get(pk=job_id))
+            done += 1
+    return done
+
+
+def requeue_stale():
+    """Вернуть в очередь задания, воркер которых завис или упал"""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.EXPORT_JOB_TIMEOUT
+    )
+    return ExportJob.objects.filter(
+        status=ExportJob.RUNNING, started_at__lt=deadline
+    ).update(status=ExportJob.PENDING, started_at=None)
+
+
+def delete_expired():
+    """Удалить выгрузки старше EXPORT_TTL_HOURS вместе с файлами"""
+    deadline = timezone.now() - timedelta(hours=settings.EXPORT_TTL_HOURS)
+    expired = ExportJob.objects.filter(created_at__lt=deadline)
+    count = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
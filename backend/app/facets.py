@@ -0,0 +1,69 @@
+"""Число рецептов по тегам для панели фильтров.
+
+Ответ кэшируется (foodgram.compression.cached_response) с ключом, в
+который входит поколение данных:
+сигналы меняют общее поколение при изменении рецептов и тегов и
+поколение пользователя при изменении его избранного и корзины, поэтому
+старые записи просто перестают читаться. Счетчики без фильтров живут
+до изменения данных, с фильтрами — FACETS_TTL секунд.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Count
+
+from . import generations
+from .models import Recipe, Tag
+
+GENERATION_KEY = 'facets:generation'
+
+
+def user_generation_key(user_id):
+    return f'facets:generation:{user_id}'
+
+
+def invalidate(user_id=None):
+    generations.bump(
+        GENERATION_KEY if user_id is None else user_generation_key(user_id)
+    )
+
+
+def tag_counts(queryset):
+    """Число рецептов выборки по каждому тегу одним запросом"""
+    through = Recipe.tags.through
+    return dict(
+        through.objects.filter(recipe__in=queryset.order_by().values('pk'))
+        .order_by().values('tag').annotate(count=Count('recipe'))
+        .values_list('tag', 'count')
+    )
+
+
+def cache_key(params, user_id=None):
+    """Ключ кэша для выборки по params; user_id передается, если
+    выборка зависит от пользователя"""
+    keys = [GENERATION_KEY]
+    if user_id is not None:
+        keys.append(user_generation_key(user_id))
+    current = generations.current_many(keys)
+    signature = json.dumps(
+        [[current[key] for key in keys], user_id,
+         sorted(params.items())]
+    )
+    return 'facets:' + hashlib.sha1(signature.encode()).hexdigest()
+
+
+def timeout(params, user_id=None):
+    if params or user_id is not None:
+        return settings.FACETS_TTL
+    return settings.FACETS_GLOBAL_TTL
+
+
+def facets(queryset):
+    """Все теги с числом рецептов выборки queryset"""
+    counts = tag_counts(queryset)
+    return [
+        {'id': tag.id, 'name': tag.name, 'slug': tag.slug,
+         'color': tag.color, 'count': counts.get(tag.id, 0)}
+        for tag in Tag.objects.all()
+    ]
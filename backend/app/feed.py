@@ -0,0 +1,127 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Рецепты обычных авторов рассылаются в ленты подписчиков при публикации
+(FeedEntry), поэтому чтение ленты — это выборка по индексу
+(user, -pub_date). Рецепты авторов, у которых больше
+FEED_FANOUT_LIMIT подписчиков, не рассылаются: их читают напрямую из
+Recipe по индексу (author, -pub_date) и сливают с лентой при чтении.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from . import cursors
+from .models import FeedEntry, Follow, Recipe
+
+BATCH_SIZE = 1000
+
+
+def is_fanned_out(author):
+    return author.followers_count <= settings.FEED_FANOUT_LIMIT
+
+
+def _add_entries(user_ids, recipes):
+    entries = (FeedEntry(user_id=user_id,
+                         recipe_id=recipe_id,
+                         pub_date=pub_date)
+               for user_id in user_ids
+               for recipe_id, pub_date in recipes)
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _latest(author_ids):
+    return list(
+        Recipe.objects.filter(author__in=author_ids)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.FEED_BACKFILL]
+    )
+
+
+def publish(recipe):
+    """Разослать новый рецепт в ленты подписчиков автора"""
+    if not is_fanned_out(recipe.author):
+        return
+    followers = (Follow.objects.filter(author_id=recipe.author_id)
+                 .values_list('user_id', flat=True).iterator())
+    _add_entries(followers, [(recipe.id, recipe.pub_date)])
+
+
+def follow(user_id, author):
+    """Добавить в ленту последние рецепты нового автора"""
+    if is_fanned_out(author):
+        _add_entries([user_id], _latest([author.id]))
+
+
+def unfollow(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id,
+                             recipe__author_id=author_id).delete()
+
+
+def backfill(author):
+    """Разослать рецепты автора, переставшего быть слишком популярным"""
+    followers = list(Follow.objects.filter(author=author)
+                     .values_list('user_id', flat=True))
+    _add_entries(followers, _latest([author.id]))
+
+
+def rebuild(user_id):
+    """Построить ленту пользователя с нуля"""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(
+        user_id=user_id,
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+    ).values('author')
+    _add_entries([user_id], _latest(authors))
+
+
+def encode_cursor(pub_date, recipe_id):
+    return cursors.encode(pub_date, recipe_id)
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор; для некорректного значения возвращает None"""
+    return cursors.decode(cursor, 1)
+
+
+def _before(position, date_field, id_field):
+    if position is None:
+        return Q()
+    pub_date, recipe_id = position
+    return (Q(**{f'{date_field}__lt': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__lt': recipe_id}))
+
+
+def page(user, position=None, size=10, queryset=None):
+    """Рецепты ленты после курсора position и курсор следующей страницы;
+    queryset задает выборку, из которой загружаются сами рецепты"""
+    fanned_out = (
+        FeedEntry.objects.filter(user=user)
+        .filter(_before(position, 'pub_date', 'recipe_id'))
+        .order_by('-pub_date', '-recipe_id')
+        .values_list('pub_date', 'recipe_id')[:size + 1]
+    )
+    popular_authors = Follow.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values('author')
+    merged = (
+        Recipe.objects.filter(author__in=popular_authors)
+        .filter(_before(position, 'pub_date', 'id'))
+        .order_by('-pub_date', '-id')
+        .values_list('pub_date', 'id')[:size + 1]
+    )
+    rows = sorted(set(fanned_out) | set(merged), reverse=True)
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(*rows[-1])
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    recipes = queryset.in_bulk([recipe_id for _, recipe_id in rows])
+    return [recipes[recipe_id] for _, recipe_id in rows
+            if recipe_id in recipes], next_cursor
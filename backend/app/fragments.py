@@ -0,0 +1,53 @@
+"""Кэш публичной части представления рецепта.
+
+Автор, теги, ингредиенты, описание и изображение одинаковы для всех
+пользователей; от пользователя зависят только признаки избранного,
+корзины и подписки на автора. Публичная часть хранится в кэше с ключом
+из id рецепта, Recipe.updated_at и общего поколения, а признаки
+подставляет сериализатор при каждом ответе.
+
+updated_at меняется при сохранении рецепта, а сигналы обновляют его и
+при изменении тегов и ингредиентов рецепта и публичных полей автора.
+Общее поколение меняется при изменении самих тегов и ингредиентов:
+переименование тега касается всех рецептов с ним.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import generations
+
+GENERATION_KEY = 'fragments:generation'
+
+
+def invalidate():
+    generations.bump(GENERATION_KEY)
+
+
+def generation():
+    return generations.current(GENERATION_KEY)
+
+
+def touch(recipes):
+    """Отметить рецепты queryset измененными"""
+    recipes.update(updated_at=timezone.now())
+
+
+def get_many(recipes, variant, render):
+    """Фрагменты рецептов в том же порядке.
+
+    variant различает наборы полей; render(recipes) строит фрагменты
+    отсутствующих в кэше рецептов, они сохраняются одним set_many.
+    """
+    current = generation()
+    keys = [f'recipe:{variant}:{current}:{recipe.pk}:'
+            f'{recipe.updated_at.timestamp()}' for recipe in recipes]
+    cached = cache.get_many(keys)
+    missing = [index for index, key in enumerate(keys) if key not in cached]
+    if missing:
+        rendered = render([recipes[index] for index in missing])
+        fresh = {keys[index]: fragment
+                 for index, fragment in zip(missing, rendered)}
+        cache.set_many(fresh, settings.RECIPE_FRAGMENT_TTL)
+        cached.update(fresh)
+    return [cached[key] for key in keys]
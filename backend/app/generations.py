@@ -0,0 +1,29 @@
+"""Счетчики поколений в общем кэше.
+
+Поколение входит в ключи кэшированных записей: смена значения делает
+все старые записи недоступными без их перебора. Если счетчик вытеснен
+из кэша, он создается заново с новым значением, поэтому старые записи
+не оживают.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def bump(key):
+    cache.set(key, time.time_ns(), None)
+
+
+def current_many(keys):
+    """Текущие значения счетчиков keys; отсутствующие создаются"""
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        values.update(cache.get_many(missing))
+    return values
+
+
+def current(key):
+    return current_many([key])[key]
@@ -0,0 +1,361 @@
+import base64
+import io
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.models import Favorites, Follow, Ingredient, Recipe, ShopingCart, Tag
+from django.conf import settings
+from django.core.management import BaseCommand, call_command
+from django.db import connection, connections
+from django.test import Client, override_settings
+from foodgram import startup
+from foodgram.sql import instrument
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+PREFIX = 'bench-api-'
+AUTOCOMPLETE = ('а', 'бе', 'мол', 'кар', 'сыр', 'со', 'ма', 'ку')
+
+
+def png():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 120, 40)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def percentile(samples, value):
+    if not samples:
+        return None
+    index = max(int(round(value / 100 * len(samples))) - 1, 0)
+    return round(samples[index], 3)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class LocalTransport:
+    """Запросы к приложению внутри процесса через тестовый клиент"""
+
+    counts_queries = True
+
+    def __init__(self, token):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def request(self, method, path, data=None):
+        counter = QueryCounter()
+        with instrument(counter):
+            response = getattr(self.client, method)(
+                path, data, content_type='application/json'
+            )
+        return response.status_code, counter.count
+
+    def close(self):
+        for conn in connections.all():
+            conn.close()
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу"""
+
+    counts_queries = False
+
+    def __init__(self, url, token):
+        import requests
+
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Token {token}'
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method.upper(), self.url + path,
+                                        json=data)
+        return response.status_code, None
+
+    def close(self):
+        self.session.close()
+
+
+class Scenarios:
+    """Набор сценариев; каждый вызов выполняет один HTTP-запрос"""
+
+    def __init__(self, image):
+        self.image = image
+        self.recipes = list(Recipe.objects.values_list('id', flat=True)
+                            .order_by('?')[:1000])
+        self.tags = list(Tag.objects.values_list('id', 'slug'))
+        self.ingredients = list(Ingredient.objects.values_list('id',
+                                                               flat=True)
+                                .order_by('?')[:200])
+        self.pages = max(Recipe.objects.count() // 6, 1)
+        self.authors = list(
+            User.objects.filter(recipe_count__gt=0)
+            .values_list('id', flat=True)[:200]
+        )
+
+    def recipe_payload(self, rnd):
+        return {
+            'name': f'{PREFIX}{uuid.uuid4().hex}',
+            'text': 'Рецепт для нагрузочного теста',
+            'cooking_time': rnd.randint(5, 120),
+            'image': self.image,
+            'tags': [tag for tag, _ in rnd.sample(self.tags,
+                                                  min(2, len(self.tags)))],
+            'ingredients': [
+                {'id': ingredient, 'amount': rnd.randint(1, 500)}
+                for ingredient in rnd.sample(self.ingredients,
+                                             min(5, len(self.ingredients)))
+            ],
+        }
+
+    def recipe_list(self, transport, rnd, state):
+        page = rnd.randint(1, min(self.pages, 50))
+        return transport.request('get', f'/api/recipes/?page={page}')
+
+    def recipe_list_filtered(self, transport, rnd, state):
+        slug = rnd.choice(self.tags)[1]
+        flags = rnd.choice(('', '&is_favorited=1', '&is_in_shopping_cart=1',
+                            f'&author={rnd.choice(self.authors)}'))
+        return transport.request('get', f'/api/recipes/?tags={slug}{flags}')
+
+    def recipe_detail(self, transport, rnd, state):
+        recipe = rnd.choice(self.recipes)
+        return transport.request('get', f'/api/recipes/{recipe}/')
+
+    def recipe_create_update(self, transport, rnd, state):
+        if 'recipe' not in state:
+            status, queries = transport.request('post', '/api/recipes/',
+                                                self.recipe_payload(rnd))
+            state['recipe'] = Recipe.objects.filter(
+                name__startswith=PREFIX, author_id=state['user']
+            ).values_list('id', flat=True).last()
+            return status, queries
+        return transport.request('patch', f'/api/recipes/{state["recipe"]}/',
+                                 self.recipe_payload(rnd))
+
+    def _toggle(self, transport, rnd, state, path):
+        key = f'toggle-{path}'
+        if key in state:
+            recipe = state.pop(key)
+            return transport.request(
+                'delete', f'/api/recipes/{recipe}/{path}/'
+            )
+        state[key] = rnd.choice(self.recipes)
+        return transport.request('post',
+                                 f'/api/recipes/{state[key]}/{path}/')
+
+    def favorite_toggle(self, transport, rnd, state):
+        return self._toggle(transport, rnd, state, 'favorite')
+
+    def cart_toggle(self, transport, rnd, state):
+        return self._toggle(transport, rnd, state, 'shopping_cart')
+
+    def shopping_list(self, transport, rnd, state):
+        return transport.request('get',
+                                 '/api/recipes/download_shopping_cart/')
+
+    def subscriptions(self, transport, rnd, state):
+        return transport.request('get', '/api/users/subscriptions/')
+
+    def ingredient_autocomplete(self, transport, rnd, state):
+        prefix = rnd.choice(AUTOCOMPLETE)
+        return transport.request('get', f'/api/ingredients/?name={prefix}')
+
+
+SCENARIOS = (
+    'recipe_list',
+    'recipe_list_filtered',
+    'recipe_detail',
+    'recipe_create_update',
+    'favorite_toggle',
+    'cart_toggle',
+    'shopping_list',
+    'subscriptions',
+    'ingredient_autocomplete',
+)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест API: задержки p50/p95/p99, пропускная '
+            'способность и число SQL-запросов на запрос в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Адрес запущенного сервера; '
+                            'по умолчанию запросы выполняются в процессе')
+        parser.add_argument('--concurrency', default='1,8',
+                            help='Уровни параллельности через запятую')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на сценарий и уровень')
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS)
+        parser.add_argument('--recipes', type=int, default=2000,
+                            help='Минимальный объем данных в рецептах; '
+                                 'недостающее создается командой seed_data')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Файл для результатов')
+        parser.add_argument('--compare', help='Результаты прошлого запуска')
+        parser.add_argument('--no-startup', action='store_true',
+                            help='Не замерять время запуска процесса')
+
+    def handle(self, *args, **options):
+        self.prepare_data(options)
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        tokens = self.prepare_users(max(levels))
+        scenarios = Scenarios(png())
+        results = {}
+        # Замеряется стоимость эндпоинтов, а не ограничение частоты
+        unthrottled = override_settings(THROTTLE_BUCKETS={
+            scope: (10 ** 9, 10 ** 9) for scope in settings.THROTTLE_BUCKETS
+        })
+        try:
+            with unthrottled:
+                for name in options['scenario'] or SCENARIOS:
+                    for level in levels:
+                        key = f'{name}@{level}'
+                        results[key] = self.run(
+                            scenarios, name, level, tokens, options
+                        )
+                        self.stdout.write(f'{key}: {results[key]}')
+        finally:
+            Recipe.objects.filter(name__startswith=PREFIX).delete()
+        if not (options['url'] or options['no_startup']):
+            for target in startup.TARGETS:
+                results[f'startup@{target}'] = {
+                    'p50_ms': startup.wall_time(target)
+                }
+                self.stdout.write(f'startup@{target}: '
+                                  f'{results[f"startup@{target}"]}')
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'database': connection.vendor,
+                'target': options['url'] or 'in-process',
+                'recipes': Recipe.objects.count(),
+                'requests': options['requests'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, ensure_ascii=False,
+                                         indent=2))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def prepare_data(self, options):
+        missing = options['recipes'] - Recipe.objects.count()
+        if missing > 0:
+            call_command('seed_data', recipes=missing,
+                         users=max(missing // 10, 100),
+                         seed=options['seed'], stdout=self.stdout)
+
+    def prepare_users(self, count):
+        tokens = []
+        recipes = list(Recipe.objects.values_list('id', flat=True)[:200])
+        authors = list(User.objects.filter(recipe_count__gt=0)
+                       .values_list('id', flat=True)[:30])
+        for number in range(count):
+            user, created = User.objects.get_or_create(
+                username=f'{PREFIX}user-{number}',
+                defaults={'email': f'{PREFIX}user-{number}@bench.local',
+                          'password': '!'}
+            )
+            if created:
+                Favorites.objects.bulk_create(
+                    Favorites(user=user, recipe_id=recipe)
+                    for recipe in recipes[:50]
+                )
+                ShopingCart.objects.bulk_create(
+                    ShopingCart(user=user, recipe_id=recipe)
+                    for recipe in recipes[50:70]
+                )
+                Follow.objects.bulk_create(
+                    Follow(user=user, author_id=author)
+                    for author in authors if author != user.id
+                )
+            tokens.append((user.id, Token.objects.get_or_create(user=user)[0]
+                           .key))
+        return tokens
+
+    def run(self, scenarios, name, level, tokens, options):
+        per_worker = max(options['requests'] // level, 1)
+        samples, queries, errors = [], [], []
+        lock = threading.Lock()
+
+        def worker(number):
+            user, token = tokens[number]
+            if options['url']:
+                transport = HttpTransport(options['url'], token)
+            else:
+                transport = LocalTransport(token)
+            rnd = random.Random(options['seed'] + number)
+            state = {'user': user}
+            try:
+                for _ in range(per_worker):
+                    start = time.perf_counter()
+                    try:
+                        status, count = getattr(scenarios, name)(
+                            transport, rnd, state
+                        )
+                    except Exception:
+                        status, count = 599, None
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        samples.append(elapsed)
+                        if count is not None:
+                            queries.append(count)
+                        if status >= 400:
+                            errors.append(status)
+            finally:
+                transport.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(level) as executor:
+            list(executor.map(worker, range(level)))
+        duration = time.perf_counter() - start
+        samples.sort()
+        return {
+            'requests': len(samples),
+            'errors': len(errors),
+            'p50_ms': percentile(samples, 50),
+            'p95_ms': percentile(samples, 95),
+            'p99_ms': percentile(samples, 99),
+            'throughput_rps': round(len(samples) / duration, 2),
+            'queries_per_request': (round(statistics.mean(queries), 2)
+                                    if queries else None),
+        }
+
+    def compare(self, path, results):
+        with open(path) as file:
+            baseline = json.load(file)['results']
+        self.stdout.write('Сравнение с ' + path)
+        for key, current in results.items():
+            previous = baseline.get(key)
+            if not previous:
+                continue
+            changes = []
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps',
+                           'queries_per_request'):
+                before, after = previous.get(metric), current.get(metric)
+                if before and after is not None:
+                    changes.append(
+                        f'{metric} {before} -> {after} '
+                        f'({(after - before) / before * 100:+.1f}%)'
+                    )
+            self.stdout.write(f'{key}: ' + ', '.join(changes))
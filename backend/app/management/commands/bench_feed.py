@@ -0,0 +1,114 @@
+import random
+import statistics
+import time
+
+from app import feed
+from app.models import Follow, Recipe
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from users.models import User
+
+PAGE_SIZE = 10
+
+
+class RollbackError(Exception):
+    pass
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return (f'median {statistics.median(samples):.2f} мс, '
+            f'p95 {samples[int(len(samples) * 0.95) - 1]:.2f} мс')
+
+
+class Command(BaseCommand):
+    help = ('Сравнить ленту подписок с выборкой рецептов по подпискам '
+            'на синтетических данных (данные откатываются)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument('--authors', type=int, default=2000)
+        parser.add_argument('--recipes-per-author', type=int, default=5)
+        parser.add_argument('--popular-authors', type=int, default=5)
+        parser.add_argument('--samples', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise RollbackError
+        except RollbackError:
+            pass
+
+    def create_users(self, prefix, count):
+        User.objects.bulk_create(
+            (User(username=f'{prefix}{i}', email=f'{prefix}{i}@bench.local',
+                  password='!')
+             for i in range(count)),
+            batch_size=1000
+        )
+        return list(User.objects.filter(username__startswith=prefix)
+                    .values_list('id', flat=True))
+
+    def run(self, options):
+        rnd = random.Random(options['seed'])
+        authors = self.create_users('bench-author-', options['authors'])
+        per_reader = min(len(authors), 1000)
+        readers = self.create_users('bench-reader-',
+                                    max(options['follows'] // per_reader, 1))
+        Recipe.objects.bulk_create(
+            (Recipe(name=f'bench-{author}-{i}', author_id=author,
+                    cooking_time=10)
+             for author in authors
+             for i in range(options['recipes_per_author'])),
+            batch_size=1000
+        )
+        Follow.objects.bulk_create(
+            (Follow(user_id=reader, author_id=author)
+             for reader in readers
+             for author in rnd.sample(authors, per_reader)),
+            batch_size=1000
+        )
+        popular = authors[:options['popular_authors']]
+        User.objects.filter(pk__in=popular).update(
+            followers_count=settings.FEED_FANOUT_LIMIT + 1
+        )
+        self.stdout.write(
+            f'Авторов: {len(authors)}, читателей: {len(readers)}, '
+            f'подписок: {Follow.objects.count()}, '
+            f'рецептов: {Recipe.objects.count()}'
+        )
+
+        build = [timed(feed.rebuild, reader) for reader in readers]
+        self.stdout.write(f'Построение ленты: {summary(build)}')
+
+        sample = rnd.sample(readers, min(options['samples'], len(readers)))
+        naive, first, second = [], [], []
+        for reader in sample:
+            naive.append(timed(lambda: list(
+                Recipe.objects.filter(author__following__user=reader)
+                .order_by('-pub_date', '-id')[:PAGE_SIZE]
+            )))
+            user = User.objects.get(pk=reader)
+            first.append(timed(feed.page, user, None, PAGE_SIZE))
+            _, cursor = feed.page(user, None, PAGE_SIZE)
+            position = feed.decode_cursor(cursor)
+            second.append(timed(feed.page, user, position, PAGE_SIZE))
+        self.stdout.write(f'Выборка по подпискам: {summary(naive)}')
+        self.stdout.write(f'Лента, первая страница: {summary(first)}')
+        self.stdout.write(f'Лента, следующая страница: {summary(second)}')
+
+        fanout = []
+        for author in rnd.sample(authors[len(popular):], 10):
+            fanout.append(timed(lambda: Recipe.objects.create(
+                name=f'bench-new-{author}', author_id=author, cooking_time=1
+            )))
+        self.stdout.write(f'Рассылка нового рецепта: {summary(fanout)}')
@@ -0,0 +1,28 @@
+import time
+
+from app import recommendations
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать рекомендации авторов по совместным подпискам '
+            '(/api/users/recommended/); запускается по расписанию')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        users, authors = recommendations.load_follows()
+        loaded = time.monotonic()
+        count = recommendations.save(
+            recommendations.compute(users, authors),
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            f'Подписок: {len(users)}, загрузка {loaded - start:.1f} с, '
+            f'расчет и запись {time.monotonic() - loaded:.1f} с'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации сохранены для {count} пользователей'
+        ))
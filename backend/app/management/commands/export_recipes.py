@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+
+from app.models import Recipe
+from django.core.management import BaseCommand
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Выгрузить рецепты с авторами, тегами, ингредиентами и '
+            'изображениями в формате JSON Lines')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл или - для stdout')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--no-images', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options)
+        else:
+            with open(options['output'], 'w') as output:
+                count = self.export(output, options)
+            self.stderr.write(f'Выгружено рецептов: {count}')
+
+    def export(self, output, options):
+        ids = (Recipe.objects.order_by('id')
+               .values_list('id', flat=True)
+               .iterator(chunk_size=options['chunk_size']))
+        seen_images = set()
+        count = 0
+        for chunk in chunks(ids, options['chunk_size']):
+            recipes = (Recipe.objects.filter(id__in=chunk).order_by('id')
+                       .select_related('author')
+                       .prefetch_related('tags',
+                                         'amount_ingredient__ingredient'))
+            for recipe in recipes:
+                record = self.serialize(recipe)
+                if not options['no_images']:
+                    record['image'] = self.image(recipe.image, seen_images)
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+        return count
+
+    def serialize(self, recipe):
+        author = recipe.author
+        return {
+            'id': recipe.id,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date.isoformat(),
+            'author': {
+                'email': author.email,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+            },
+            'tags': [
+                {'slug': tag.slug, 'name': tag.name, 'color': tag.color}
+                for tag in recipe.tags.all()
+            ],
+            'ingredients': [
+                {'name': amount.ingredient.name,
+                 'measurement_unit': amount.ingredient.measurement_unit,
+                 'amount': amount.amount}
+                for amount in recipe.amount_ingredient.all()
+            ],
+        }
+
+    def image(self, image, seen):
+        """Изображение выгружается один раз, повторы ссылаются на хэш"""
+        if not image:
+            return None
+        try:
+            with image.open('rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        digest = hashlib.sha256(data)
+        record = {'sha256': digest.hexdigest(),
+                  'extension': os.path.splitext(image.name)[1]}
+        if digest.digest() not in seen:
+            seen.add(digest.digest())
+            record['data'] = base64.b64encode(data).decode()
+        return record
@@ -0,0 +1,73 @@
+import os
+import time
+
+from app.models import Recipe
+from app.storage import delete_file, delete_unused, recount
+from app.thumbnails import THUMBNAILS_DIR, thumbnail_name
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+
+IMAGES_DIR = 'app/images/'
+
+
+def scan(path):
+    """Обход каталога без построения полного списка файлов"""
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = ('Удалить изображения и уменьшенные копии, на которые '
+            'не ссылается ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float,
+            default=settings.MEDIA_GC_GRACE_HOURS,
+            help='Не трогать файлы моложе указанного числа часов'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            # Иначе файл с завышенным счетчиком не удалился бы никогда
+            fixed = recount()
+            if fixed:
+                self.stdout.write(f'Исправлено счетчиков ссылок: {fixed}')
+        referenced = set()
+        for name in (Recipe.objects.exclude(image__isnull=True)
+                     .exclude(image='').values_list('image', flat=True)
+                     .iterator(chunk_size=10000)):
+            referenced.add(name)
+            referenced.add(thumbnail_name(name))
+        deadline = time.time() - options['grace_hours'] * 3600
+        root = settings.MEDIA_ROOT
+        removed = size = 0
+        for directory in (IMAGES_DIR, THUMBNAILS_DIR):
+            for entry in scan(default_storage.path(directory)):
+                name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                stat = entry.stat(follow_symlinks=False)
+                if name in referenced or stat.st_mtime > deadline:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(name)
+                elif name.startswith(IMAGES_DIR):
+                    if not delete_unused(name, options['grace_hours']):
+                        continue
+                else:
+                    delete_file(name)
+                removed += 1
+                size += stat.st_size
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed}, {size / 2 ** 20:.1f} МБ'
+        ))
@@ -0,0 +1,202 @@
+import base64
+import json
+import os
+from collections import Counter
+
+from app import facets
+from app.bulk import Writer, fill_dates, insert
+from app.models import CountIngredients, Ingredient, Recipe, Tag
+from app.sql import count_related
+from app.storage import hashed_name, retain
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from users.models import User
+
+IMAGES_DIR = 'app/images/'
+
+
+class Command(BaseCommand):
+    help = ('Загрузить рецепты, выгруженные export_recipes. Загрузка '
+            'идет пакетами и продолжается с места остановки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать с начала файла, забыв прогресс')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY на PostgreSQL')
+
+    def handle(self, *args, **options):
+        progress_path = options['input'] + '.progress'
+        ids_path = options['input'] + '.ids'
+        offset = 0
+        if os.path.exists(progress_path) and not options['restart']:
+            with open(progress_path) as file:
+                offset = int(file.read() or 0)
+            self.stderr.write(f'Продолжение с позиции {offset}')
+        self.writer = Writer(options['batch_size'], not options['no_copy'])
+        self.tags = {tag.slug: tag.id for tag in Tag.objects.all()}
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        }
+        imported = skipped = 0
+        ids_file = open(ids_path, 'a')
+        with open(options['input'], 'rb') as source, ids_file:
+            source.seek(offset)
+            batch = []
+            while True:
+                line = source.readline()
+                if line.strip():
+                    try:
+                        batch.append(json.loads(line))
+                    except ValueError as error:
+                        raise CommandError(
+                            f'Некорректная строка на позиции {offset}: '
+                            f'{error}'
+                        )
+                if batch and (len(batch) == options['batch_size']
+                              or not line):
+                    created = self.import_batch(batch, ids_file)
+                    imported += created
+                    skipped += len(batch) - created
+                    batch = []
+                    ids_file.flush()
+                    with open(progress_path, 'w') as file:
+                        file.write(str(source.tell()))
+                if not line:
+                    break
+        os.remove(progress_path)
+        facets.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {imported}, пропущено: {skipped}. '
+            f'Соответствие идентификаторов: {ids_path}'
+        ))
+
+    @transaction.atomic
+    def import_batch(self, records, ids_file):
+        # Сначала решаем, какие записи будут вставлены, и только для них
+        # сохраняем изображения: иначе файлы пропущенных остались бы без
+        # владельца и счетчика ссылок
+        existing = set(
+            Recipe.objects.filter(name__in=[r['name'] for r in records])
+            .values_list('name', flat=True)
+        )
+        unique = {}
+        for record in records:
+            if record['name'] not in existing:
+                unique.setdefault(record['name'], record)
+        records = list(unique.values())
+        if not records:
+            return 0
+        authors = self.get_authors([r['author'] for r in records])
+        records = [r for r in records if r['author']['email'] in authors]
+        if not records:
+            return 0
+        for record in records:
+            self.add_tags(record['tags'])
+            self.add_ingredients(record['ingredients'])
+        recipes = [
+            Recipe(name=record['name'],
+                   text=record['text'],
+                   cooking_time=record['cooking_time'],
+                   pub_date=parse_datetime(record['pub_date']),
+                   author_id=authors[record['author']['email']],
+                   image=self.save_image(record.get('image')))
+            for record in records
+        ]
+        fill_dates(recipes)
+        insert(Recipe, recipes)
+        images = Counter(recipe.image.name for recipe in recipes)
+        for name, count in images.items():
+            retain(name, count)
+        ids = dict(Recipe.objects.filter(
+            name__in=[r['name'] for r in records]
+        ).values_list('name', 'id'))
+        self.writer.write(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=ids[record['name']],
+                                tag_id=self.tags[tag['slug']])
+            for record in records for tag in record['tags']
+        ))
+        self.writer.write(CountIngredients, (
+            CountIngredients(
+                recipe_id=ids[record['name']],
+                ingredient_id=self.ingredients[
+                    (item['name'], item['measurement_unit'])
+                ],
+                amount=item['amount'])
+            for record in records for item in record['ingredients']
+        ))
+        self.update_authors(authors.values())
+        for record in records:
+            ids_file.write(f'{record["id"]},{ids[record["name"]]}\n')
+        return len(records)
+
+    def get_authors(self, authors):
+        """id авторов по email; автор, чей username занят пользователем с
+        другим email, пропускается вместе со своими рецептами"""
+        emails = {author['email']: author for author in authors}
+        found = dict(User.objects.filter(email__in=emails)
+                     .values_list('email', 'id'))
+        missing = {author['username']: author
+                   for email, author in emails.items() if email not in found}
+        taken = set(User.objects.filter(username__in=missing)
+                    .values_list('username', flat=True))
+        for username in taken:
+            self.stderr.write(
+                f'Пропущены рецепты автора {missing[username]["email"]}: '
+                f'имя {username} занято другим пользователем'
+            )
+        if missing:
+            User.objects.bulk_create(
+                (User(password=make_password(None), **author)
+                 for username, author in missing.items()
+                 if username not in taken),
+                ignore_conflicts=True
+            )
+            found.update(User.objects.filter(
+                email__in=[author['email'] for author in missing.values()]
+            ).values_list('email', 'id'))
+        return found
+
+    def add_tags(self, tags):
+        for tag in tags:
+            if tag['slug'] not in self.tags:
+                self.tags[tag['slug']] = Tag.objects.get_or_create(
+                    slug=tag['slug'],
+                    defaults={'name': tag['name'], 'color': tag['color']}
+                )[0].id
+
+    def add_ingredients(self, items):
+        for item in items:
+            key = (item['name'], item['measurement_unit'])
+            if key not in self.ingredients:
+                self.ingredients[key] = Ingredient.objects.get_or_create(
+                    name=key[0], measurement_unit=key[1]
+                )[0].id
+
+    def save_image(self, image):
+        """Изображение, уже сохраненное в хранилище, не загружается
+        повторно: имя файла вычисляется по хэшу (app.storage)"""
+        if not image:
+            return ''
+        name = hashed_name(IMAGES_DIR, image['sha256'], image['extension'])
+        if default_storage.exists(name):
+            return name
+        if 'data' not in image:
+            self.stderr.write(f'Нет данных изображения {image["sha256"]}')
+            return ''
+        return default_storage.save(
+            IMAGES_DIR + image['sha256'] + image['extension'],
+            ContentFile(base64.b64decode(image['data']))
+        )
+
+    def update_authors(self, authors):
+        User.objects.filter(pk__in=authors).update(
+            recipe_count=count_related(Recipe, 'author')
+        )
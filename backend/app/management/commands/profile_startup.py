@@ -0,0 +1,59 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+from foodgram import startup
+
+
+class Command(BaseCommand):
+    help = ('Время запуска воркера WSGI или manage.py и вклад каждого '
+            'импортируемого модуля')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=startup.TARGETS,
+                            default='wsgi')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument(
+            '--max-ms', type=float,
+            help='Завершиться с ошибкой, если запуск дольше, для CI'
+        )
+
+    def handle(self, *args, **options):
+        target = options['target']
+        try:
+            wall = startup.wall_time(target, options['repeat'])
+            modules = startup.import_times(target)
+        except RuntimeError as error:
+            raise CommandError(f'Не удалось запустить {target}: {error}')
+        packages = sorted(startup.by_package(modules).items(),
+                          key=lambda item: item[1], reverse=True)
+        slowest = sorted(modules.items(), key=lambda item: item[1][0],
+                         reverse=True)
+        top = options['top']
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'target': target,
+                'wall_ms': wall,
+                'import_ms': round(sum(own for own, _ in modules.values()),
+                                   1),
+                'packages': {name: round(ms, 1)
+                             for name, ms in packages[:top]},
+                'modules': {name: {'self_ms': own,
+                                   'cumulative_ms': cumulative}
+                            for name, (own, cumulative) in slowest[:top]},
+            }, indent=2))
+        else:
+            self.stdout.write(f'Запуск {target}: {wall} мс (медиана из '
+                              f'{options["repeat"]}), импорт модулей: '
+                              f'{sum(own for own, _ in modules.values()):.1f}'
+                              f' мс')
+            self.stdout.write('\nПакеты, мс:')
+            for name, ms in packages[:top]:
+                self.stdout.write(f'{ms:10.1f}  {name}')
+            self.stdout.write('\nМодули, собственное / с вложенными, мс:')
+            for name, (own, cumulative) in slowest[:top]:
+                self.stdout.write(f'{own:10.1f} {cumulative:10.1f}  {name}')
+        if options['max_ms'] and wall > options['max_ms']:
+            raise CommandError(f'Запуск {target} занимает {wall} мс, '
+                               f'допустимо {options["max_ms"]} мс')
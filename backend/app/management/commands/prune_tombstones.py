@@ -0,0 +1,10 @@
+from app import sync
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Удалить отметки об удалении старше SYNC_TOMBSTONE_DAYS дней; '
+            'запускается по расписанию')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Удалено отметок: {sync.prune()}')
@@ -0,0 +1,22 @@
+from app import feed
+from app.models import Follow
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Перестроить ленты подписок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        users = options['user_id'] or list(
+            Follow.objects.order_by('user_id').values_list('user_id',
+                                                           flat=True)
+            .distinct()
+        )
+        count = 0
+        for user_id in users:
+            feed.rebuild(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Перестроено лент: {count}'))
@@ -0,0 +1,42 @@
+from itertools import chain
+
+from app import popularity
+from app.models import Favorites, Recipe, ShopingCart
+from app.sql import count_related
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+BATCH_SIZE = 1000
+
+
+def _events(model, weight):
+    for recipe_id, added_at in (model.objects.order_by()
+                                .values_list('recipe_id', 'added_at')
+                                .iterator(chunk_size=20000)):
+        yield recipe_id, weight, added_at
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать рейтинг популярности рецептов по текущему '
+            'содержимому избранного и корзин')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Каждое событие учитывается на момент добавления, как в
+            # popularity.register, поэтому последующие unregister
+            # вычитают ровно его вклад
+            scores = popularity.scores(chain(
+                _events(Favorites, settings.TRENDING_FAVORITE_WEIGHT),
+                _events(ShopingCart, settings.TRENDING_SHOPPING_CART_WEIGHT),
+            ))
+            Recipe.objects.update(
+                count_add_favorite=count_related(Favorites, 'recipe'),
+                popularity=0
+            )
+            Recipe.objects.bulk_update(
+                [Recipe(pk=pk, popularity=score)
+                 for pk, score in scores.items()],
+                ['popularity'], batch_size=BATCH_SIZE
+            )
+        self.stdout.write(self.style.SUCCESS('Рейтинг пересчитан'))
@@ -0,0 +1,34 @@
+import time
+
+from app import exports
+from django.core.management import BaseCommand
+
+CLEANUP_INTERVAL = 600
+
+
+class Command(BaseCommand):
+    help = ('Выполнять фоновые выгрузки из очереди ExportJob. Нужен, '
+            'если EXPORT_WORKER_THREADS = 0 или выгрузок много')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить очередь и завершиться')
+        parser.add_argument('--poll-interval', type=float, default=2)
+
+    def handle(self, *args, **options):
+        cleaned_at = 0
+        while True:
+            if time.monotonic() - cleaned_at > CLEANUP_INTERVAL:
+                requeued = exports.requeue_stale()
+                deleted = exports.delete_expired()
+                if requeued or deleted:
+                    self.stdout.write(f'Возвращено в очередь: {requeued}, '
+                                      f'удалено устаревших: {deleted}')
+                cleaned_at = time.monotonic()
+            done = exports.run_pending()
+            if done:
+                self.stdout.write(f'Выполнено выгрузок: {done}')
+            if options['once']:
+                return
+            if not done:
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,227 @@
+import csv
+import os
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from app import catalogue, facets
+from app.bulk import Writer
+from app.models import (CountIngredients, Favorites, Follow, Ingredient,
+                        Recipe, ShopingCart, Tag)
+from app.sql import count_related
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from users.models import User
+
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Десерт', 'dessert', '#F2C94C'),
+    ('Выпечка', 'bakery', '#B5651D'),
+    ('Салат', 'salad', '#27AE60'),
+    ('Суп', 'soup', '#2D9CDB'),
+    ('Напиток', 'drink', '#56CCF2'),
+)
+WORDS = ('быстрый', 'домашний', 'острый', 'сытный', 'легкий', 'пряный',
+         'летний', 'зимний', 'праздничный', 'бабушкин', 'постный', 'нежный')
+PASSWORD = 'foodgram-seed'
+
+
+def zipf(count, skew):
+    """Накопленные веса распределения Ципфа для rnd.choices"""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def pick_unique(rnd, population, cum_weights, count, exclude=None):
+    count = min(count, len(population) - (1 if exclude else 0))
+    chosen = set()
+    attempts = count * 5
+    while len(chosen) < count and attempts:
+        for item in rnd.choices(population, cum_weights=cum_weights,
+                                k=count - len(chosen)):
+            if item != exclude:
+                chosen.add(item)
+        attempts -= 1
+    return chosen
+
+
+class Command(BaseCommand):
+    help = ('Заполнить базу синтетическими пользователями, рецептами, '
+            'подписками, избранным и корзинами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--authors-share', type=float, default=0.2,
+                            help='Доля пользователей, публикующих рецепты')
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=7)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--favorites-per-user', type=int, default=30)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Показатель распределения Ципфа для '
+                                 'популярности авторов, рецептов и '
+                                 'ингредиентов')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY на PostgreSQL')
+        parser.add_argument('--feed', action='store_true',
+                            help='Перестроить ленты подписок')
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.options = options
+        self.writer = Writer(options['batch_size'], not options['no_copy'])
+        self.now = timezone.now()
+        started = time.monotonic()
+        with transaction.atomic():
+            ingredients = self.ingredients()
+            tags = self.tags()
+            users = self.users()
+            authors = users[:max(int(len(users)
+                                     * options['authors_share']), 1)]
+            recipes = self.recipes(authors, tags, ingredients)
+            self.relations(users, authors, recipes)
+            self.reset_sequences()
+            self.update_counters()
+        facets.invalidate()
+        catalogue.invalidate()
+        call_command('rebuild_popularity', stdout=self.stdout)
+        if options['feed']:
+            call_command('rebuild_feed', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'
+        ))
+
+    def report(self, name, count):
+        self.stdout.write(f'{name}: {count}')
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def ingredients(self):
+        if not Ingredient.objects.exists():
+            path = os.path.join(settings.CSV_FILES_DIR, 'ingredients.csv')
+            with open(path) as file:
+                rows = {(row[0], row[1]) for row in csv.reader(file)}
+            self.report('Ингредиенты', self.writer.write(
+                Ingredient,
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in sorted(rows))
+            ))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        self.rnd.shuffle(ingredients)
+        return ingredients
+
+    def tags(self):
+        for name, slug, color in TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={'name': name,
+                                                           'color': color})
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def users(self):
+        start = self.next_id(User)
+        password = make_password(PASSWORD)
+        count = self.options['users']
+        self.report('Пользователи', self.writer.write(User, (
+            User(id=start + number,
+                 username=f'seed-{start + number}',
+                 email=f'seed-{start + number}@seed.local',
+                 first_name=f'Имя{number}',
+                 last_name=f'Фамилия{number}',
+                 password=password,
+                 date_joined=self.now)
+            for number in range(count)
+        )))
+        users = list(range(start, start + count))
+        self.rnd.shuffle(users)
+        return users
+
+    def recipes(self, authors, tags, ingredients):
+        rnd = self.rnd
+        start = self.next_id(Recipe)
+        count = self.options['recipes']
+        author_weights = zipf(len(authors), self.options['skew'])
+        tag_weights = zipf(len(tags), 0.8)
+        ingredient_weights = zipf(len(ingredients), self.options['skew'])
+        per_recipe = self.options['ingredients_per_recipe']
+        recipes = list(range(start, start + count))
+        authors_of = rnd.choices(authors, cum_weights=author_weights,
+                                 k=count)
+        self.report('Рецепты', self.writer.write(Recipe, (
+            Recipe(id=recipe,
+                   name=f'{rnd.choice(WORDS).capitalize()} рецепт {recipe}',
+                   author_id=author,
+                   cooking_time=max(int(rnd.lognormvariate(3.4, 0.6)), 1),
+                   text=' '.join(rnd.choices(WORDS, k=rnd.randint(20, 200))),
+                   pub_date=self.now - timedelta(
+                       seconds=rnd.randint(0, 365 * 24 * 3600)
+                   ))
+            for recipe, author in zip(recipes, authors_of)
+        )))
+        self.report('Теги рецептов', self.writer.write(
+            Recipe.tags.through,
+            (Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+             for recipe in recipes
+             for tag in pick_unique(rnd, tags, tag_weights,
+                                    rnd.randint(1, 3)))
+        ))
+        self.report('Ингредиенты рецептов', self.writer.write(
+            CountIngredients,
+            (CountIngredients(recipe_id=recipe, ingredient_id=ingredient,
+                              amount=rnd.choice((1, 2, 5, 10, 50, 100, 200,
+                                                 250, 500)))
+             for recipe in recipes
+             for ingredient in pick_unique(
+                rnd, ingredients, ingredient_weights,
+                max(int(rnd.gauss(per_recipe, per_recipe / 3)), 1)
+            ))
+        ))
+        rnd.shuffle(recipes)
+        return recipes
+
+    def relations(self, users, authors, recipes):
+        rnd = self.rnd
+        skew = self.options['skew']
+        author_weights = zipf(len(authors), skew)
+        recipe_weights = zipf(len(recipes), skew)
+        for model, population, weights, per_user, field in (
+            (Follow, authors, author_weights,
+             self.options['follows_per_user'], 'author_id'),
+            (Favorites, recipes, recipe_weights,
+             self.options['favorites_per_user'], 'recipe_id'),
+            (ShopingCart, recipes, recipe_weights,
+             self.options['carts_per_user'], 'recipe_id'),
+        ):
+            self.report(model._meta.verbose_name_plural, self.writer.write(
+                model,
+                (model(user_id=user, **{field: item})
+                 for user in users
+                 for item in pick_unique(
+                    rnd, population, weights,
+                    int(rnd.expovariate(1 / per_user)) if per_user else 0,
+                    exclude=user if model is Follow else None
+                ))
+            ))
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe, Ingredient]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def update_counters(self):
+        User.objects.filter(username__startswith='seed-').update(
+            recipe_count=count_related(Recipe, 'author'),
+            followers_count=count_related(Follow, 'author'),
+        )
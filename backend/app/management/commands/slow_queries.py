@@ -0,0 +1,52 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+from foodgram import slow_queries
+
+
+class Command(BaseCommand):
+    help = ('Самые медленные шаблоны запросов по суммарному времени из '
+            'журнала SLOW_QUERY_LOG')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--hours', type=float,
+                            help='Только записи за последние часы')
+        parser.add_argument('--plans', action='store_true',
+                            help='Показать последний план каждого запроса')
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG)
+
+    def handle(self, *args, **options):
+        log = options['log']
+        paths = [log] + [f'{log}.{number}' for number
+                         in range(1, settings.SLOW_QUERY_LOG_BACKUPS + 1)]
+        entries = slow_queries.read(paths)
+        if options['hours']:
+            since = (timezone.now()
+                     - timedelta(hours=options['hours'])).isoformat()
+            entries = (entry for entry in entries if entry['time'] >= since)
+        top = slow_queries.summarize(entries)[:options['top']]
+        if options['json']:
+            self.stdout.write(json.dumps(top, ensure_ascii=False, indent=2))
+            return
+        if not top:
+            self.stdout.write('Медленных запросов нет')
+        for summary in top:
+            self.stdout.write(
+                f'{summary["total_ms"]:10.0f} мс всего, '
+                f'{summary["count"]} раз, '
+                f'в среднем {summary["total_ms"] / summary["count"]:.1f} мс, '
+                f'максимум {summary["max_ms"]:.1f} мс'
+            )
+            self.stdout.write(f'  {summary["sql"][:300]}')
+            for place, count in sorted(summary['views'].items(),
+                                       key=lambda item: item[1],
+                                       reverse=True):
+                self.stdout.write(f'  {count:6d}  {place}')
+            if options['plans'] and summary['plan']:
+                for line in summary['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_auto_20230615_2248'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(db_index=True, default=0, help_text='Сумма добавлений в избранное и корзину с затуханием по времени, см. app.popularity', verbose_name='Популярность'),
+        ),
+    ]
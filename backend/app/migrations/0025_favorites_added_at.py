@@ -0,0 +1,24 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:19
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0024_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorites',
+            name='added_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='favorites',
+            index=models.Index(fields=['user', '-added_at'], name='favorites_user_added_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_refs(apps, schema_editor):
+    Recipe = apps.get_model('app', 'Recipe')
+    MediaBlob = apps.get_model('app', 'MediaBlob')
+    refs = (Recipe.objects.exclude(image__isnull=True).exclude(image='')
+            .order_by().values('image').annotate(refs=Count('pk')))
+    MediaBlob.objects.bulk_create(
+        (MediaBlob(name=row['image'], refs=row['refs']) for row in refs),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0025_favorites_added_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь к файлу')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+        migrations.RunPython(count_refs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-19 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0030_authorrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='uploaded_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата последней загрузки'),
+        ),
+    ]
@@ -100,14 +100,40 @@ class Recipe(models.Model):
         default=0,
         null=True
     )
+    popularity = models.FloatField(
+        "Популярность",
+        default=0,
+        help_text="Сумма добавлений в избранное и корзину с затуханием "
+                  "по времени, см. app.popularity"
+    )
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        # Сортировки api.filters.RecipeFilter: полная лента, фильтр по
+        # времени приготовления и страницы автора читаются по индексу
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_date_idx'),
+            models.Index(fields=['cooking_time', '-pub_date', '-id'],
+                         name='recipe_cooking_time_idx'),
+            models.Index(fields=['-popularity', '-pub_date', '-id'],
+                         name='recipe_popularity_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_date_idx'),
+            models.Index(fields=['author', 'cooking_time', '-pub_date',
+                                 '-id'],
+                         name='recipe_author_time_idx'),
+            models.Index(fields=['updated_at', 'id'],
+                         name='recipe_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -153,11 +179,18 @@ class Follow(models.Model):
         verbose_name='Автор',
         on_delete=models.CASCADE
     )
+    added_at = models.DateTimeField(
+        'Дата подписки', auto_now_add=True
+    )
 
     class Meta:
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         unique_together = ('user', 'author',)
+        indexes = [
+            models.Index(fields=['user', 'added_at', 'id'],
+                         name='follow_user_added_idx'),
+        ]
         UniqueConstraint(fields=['user', 'author'],
                          name='unique_follow')
 
@@ -178,11 +211,18 @@ class Favorites(models.Model):
         verbose_name='Избранный рецепт',
         on_delete=models.CASCADE
     )
+    added_at = models.DateTimeField(
+        'Дата добавления', auto_now_add=True
+    )
 
     class Meta:
         verbose_name = "Избранное"
         verbose_name_plural = "Избранное"
         unique_together = ('user', 'recipe',)
+        indexes = [
+            models.Index(fields=['user', '-added_at'],
+                         name='favorites_user_added_idx'),
+        ]
         UniqueConstraint(fields=['user', 'recipe'],
                          name='unique_favorite')
 
@@ -203,12 +243,181 @@ class ShopingCart(models.Model):
         verbose_name='Рецепт в корзине',
         on_delete=models.CASCADE
     )
+    added_at = models.DateTimeField(
+        'Дата добавления', auto_now_add=True
+    )
 
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзина"
+        indexes = [
+            models.Index(fields=['user', 'added_at', 'id'],
+                         name='cart_user_added_idx'),
+        ]
         UniqueConstraint(fields=['user', 'recipe'],
                          name='unique_recipe_in_shoping_cart')
 
     def __str__(self):
         return f'{self.user.username} {self.recipe.name}'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: рецепт автора, разосланный подписчику"""
+
+    user = models.ForeignKey(
+        User,
+        related_name='feed',
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe')
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Лента подписок"
+        unique_together = ('user', 'recipe',)
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.recipe_id}'
+
+
+class Tombstone(models.Model):
+    """Отметка об удалении для синхронизации клиентов (app.sync)"""
+
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    FOLLOW = 'follow'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Корзина'),
+        (FOLLOW, 'Подписка'),
+    )
+
+    kind = models.CharField('Тип', max_length=16, choices=KINDS)
+    # Без ограничения внешнего ключа: отметки создаются сигналами и при
+    # каскадном удалении самого пользователя, устаревшие удаляет
+    # prune_tombstones
+    user = models.ForeignKey(
+        User,
+        related_name='+',
+        verbose_name='Пользователь',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        help_text='Владелец избранного, корзины или подписки'
+    )
+    object_id = models.PositiveBigIntegerField(
+        'Id рецепта или автора'
+    )
+    deleted_at = models.DateTimeField('Дата удаления', auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Удаление"
+        verbose_name_plural = "Удаления"
+        indexes = [
+            models.Index(fields=['kind', 'user', 'deleted_at', 'id'],
+                         name='tombstone_kind_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class AuthorRecommendation(models.Model):
+    """Рекомендованные авторы пользователя по совместным подпискам
+    (app.recommendations): список [id автора, оценка] по убыванию"""
+
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='recommendation',
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE
+    )
+    authors = models.JSONField('Авторы', default=list)
+    computed_at = models.DateTimeField('Дата расчета', auto_now=True)
+
+    class Meta:
+        verbose_name = "Рекомендации"
+        verbose_name_plural = "Рекомендации"
+
+    def __str__(self):
+        return f'{self.user_id}: {len(self.authors)}'
+
+
+class MediaBlob(models.Model):
+    """Файл в хранилище с именами по хэшу содержимого (app.storage)
+    и число рецептов, которые на него ссылаются"""
+
+    name = models.CharField('Путь к файлу', max_length=255, unique=True)
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
+    created_at = models.DateTimeField('Дата загрузки', auto_now_add=True)
+    uploaded_at = models.DateTimeField('Дата последней загрузки',
+                                       auto_now=True)
+
+    class Meta:
+        verbose_name = "Файл"
+        verbose_name_plural = "Файлы"
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
+
+
+class ExportJob(models.Model):
+    """Фоновое формирование файла для скачивания (app.exports)"""
+
+    SHOPPING_LIST = 'shopping_list'
+    KINDS = (
+        (SHOPPING_LIST, 'Список покупок'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        related_name='export_jobs',
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE
+    )
+    kind = models.CharField('Тип', max_length=32, choices=KINDS)
+    status = models.CharField('Статус', max_length=16, choices=STATUSES,
+                              default=PENDING)
+    file = models.FileField('Файл', upload_to='exports/', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    started_at = models.DateTimeField('Начато', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = "Выгрузка"
+        verbose_name_plural = "Выгрузки"
+        indexes = [
+            models.Index(fields=['status', 'created_at'],
+                         name='export_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.user_id} {self.status}'
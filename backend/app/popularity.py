@@ -0,0 +1,97 @@
+"""Рейтинг популярности рецептов с экспоненциальным затуханием.
+
+Вместо того чтобы периодически уменьшать рейтинг всех рецептов, вес
+каждого нового события умножается на exp((t - EPOCH) / tau): все рейтинги
+затухают с одинаковой скоростью, поэтому порядок рецептов при таком
+масштабе совпадает с порядком по «текущему» рейтингу. Чтобы значения не
+переполнялись со временем, в Recipe.popularity хранится натуральный
+логарифм суммы, а новые события добавляются через log-sum-exp одним
+атомарным UPDATE. Значение 0 означает отсутствие событий.
+"""
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+
+def _tau():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+
+def _epoch():
+    return timezone.make_aware(
+        datetime.fromisoformat(settings.TRENDING_EPOCH),
+        timezone.utc
+    )
+
+
+def event_score(weight, at=None):
+    """Логарифм вклада события с весом weight, произошедшего в момент at,
+    в масштабе эпохи"""
+    at = at or timezone.now()
+    return math.log(weight) + (at - _epoch()).total_seconds() / _tau()
+
+
+def decayed(score, at=None):
+    """Рейтинг, приведенный к моменту at (для отображения)"""
+    if not score:
+        return 0.0
+    return math.exp(score - event_score(1, at))
+
+
+def scores(events):
+    """Рейтинги по событиям (id рецепта, вес, момент события) — тот же
+    результат, что последовательные register"""
+    result = {}
+    for recipe_id, weight, at in events:
+        score = event_score(weight, at)
+        current = result.get(recipe_id)
+        result[recipe_id] = score if current is None else (
+            max(current, score) + math.log1p(math.exp(-abs(current - score)))
+        )
+    return result
+
+
+def register(recipe_id, weight, added_at, favorite=False):
+    """Учесть добавление рецепта в избранное или корзину в момент
+    added_at"""
+    from app.models import Recipe
+
+    score = Value(event_score(weight, at=added_at), output_field=FloatField())
+    changes = {
+        'popularity': Greatest(F('popularity'), score) + Ln(
+            1 + Exp(-Abs(F('popularity') - score))
+        )
+    }
+    if favorite:
+        changes['count_add_favorite'] = F('count_add_favorite') + 1
+    Recipe.objects.filter(pk=recipe_id).update(**changes)
+
+
+def unregister(recipe_id, weight, added_at, favorite=False):
+    """Учесть удаление рецепта из избранного или корзины; вычитается
+    вклад события на момент добавления added_at"""
+    from app.models import Recipe
+
+    score = event_score(weight, at=added_at)
+    changes = {
+        'popularity': Case(
+            When(
+                popularity__gt=score + 1e-9,
+                then=Greatest(
+                    F('popularity') + Ln(1 - Exp(score - F('popularity'))),
+                    Value(0.0)
+                ),
+            ),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    }
+    if favorite:
+        changes['count_add_favorite'] = Greatest(
+            F('count_add_favorite') - 1, Value(0)
+        )
+    Recipe.objects.filter(pk=recipe_id).update(**changes)
@@ -0,0 +1,159 @@
+"""Рекомендации авторов по совместным подпискам.
+
+F — матрица подписок (пользователи × авторы). Произведение FᵀF дает
+для каждой пары авторов число общих подписчиков; после нормировки
+(косинусная мера) у каждого автора остается RECOMMENDATION_NEIGHBORS
+самых похожих. Оценка автора для пользователя — сумма похожести на
+авторов, на которых он уже подписан: строка произведения F·S. Первые
+RECOMMENDATIONS_TOP авторов сохраняются в AuthorRecommendation.
+
+Матрицы перемножаются как разреженные (scipy). Подписки
+пользователей, у которых их больше RECOMMENDATION_MAX_FOLLOWS, в
+похожести авторов не учитываются: такие списки почти случайны, а число
+пар в них растет квадратично.
+"""
+import heapq
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from users.models import User
+
+from .bulk import Writer
+from .models import AuthorRecommendation, Follow
+
+CHUNK_USERS = 10000
+POPULAR_KEY = 'recommendations:popular'
+
+
+def load_follows():
+    """Подписки двумя массивами: id пользователей и id авторов"""
+    users, authors = array('q'), array('q')
+    pairs = (Follow.objects.order_by().values_list('user_id', 'author_id')
+             .iterator(chunk_size=20000))
+    for user_id, author_id in pairs:
+        users.append(user_id)
+        authors.append(author_id)
+    return users, authors
+
+
+def compute(users, authors):
+    """Пары (id пользователя, [[id автора, оценка], ...])"""
+    # numpy и scipy нужны только расчету, веб-процессы их не загружают
+    import numpy
+    from scipy import sparse
+
+    user_ids, rows = numpy.unique(numpy.frombuffer(users, dtype=numpy.int64),
+                                  return_inverse=True)
+    author_ids, columns = numpy.unique(
+        numpy.frombuffer(authors, dtype=numpy.int64), return_inverse=True
+    )
+    follows = sparse.csr_matrix(
+        (numpy.ones(len(rows), dtype=numpy.float32), (rows, columns)),
+        shape=(len(user_ids), len(author_ids))
+    )
+    follows.sum_duplicates()
+    follows.data[:] = 1
+    per_user = numpy.diff(follows.indptr)
+    counted = sparse.diags(
+        (per_user <= settings.RECOMMENDATION_MAX_FOLLOWS).astype(numpy.float32)
+    ) @ follows
+    common = (counted.T @ counted).tocoo()
+    keep = ((common.row != common.col)
+            & (common.data >= settings.RECOMMENDATION_MIN_COMMON))
+    row, column = common.row[keep], common.col[keep]
+    followers = numpy.asarray(counted.sum(axis=0)).ravel()
+    similarity = sparse.csr_matrix(
+        (common.data[keep] / numpy.sqrt(followers[row] * followers[column]),
+         (row, column)),
+        shape=(len(author_ids), len(author_ids))
+    )
+    similarity = _prune(similarity, settings.RECOMMENDATION_NEIGHBORS)
+    author_column = {author: index for index, author in enumerate(author_ids)}
+    top = settings.RECOMMENDATIONS_TOP
+    for start in range(0, len(user_ids), CHUNK_USERS):
+        block = follows[start:start + CHUNK_USERS]
+        scores = (block @ similarity).tocsr()
+        for offset in range(block.shape[0]):
+            user_id = int(user_ids[start + offset])
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            excluded = set(block.indices[block.indptr[offset]:
+                                         block.indptr[offset + 1]])
+            excluded.add(author_column.get(user_id))
+            candidates = (
+                (score, column) for column, score
+                in zip(scores.indices[begin:end], scores.data[begin:end])
+                if column not in excluded
+            )
+            best = heapq.nlargest(top, candidates)
+            if best:
+                yield user_id, [
+                    [int(author_ids[column]), round(float(score), 4)]
+                    for score, column in best
+                ]
+
+
+def _prune(matrix, neighbors):
+    """Оставить в каждой строке neighbors наибольших значений"""
+    import numpy
+    from scipy import sparse
+
+    matrix = matrix.tocsr()
+    rows, columns, values = [], [], []
+    for row in range(matrix.shape[0]):
+        begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+        data = matrix.data[begin:end]
+        indices = matrix.indices[begin:end]
+        if len(data) > neighbors:
+            best = numpy.argpartition(-data, neighbors)[:neighbors]
+            data, indices = data[best], indices[best]
+        rows.append(numpy.full(len(data), row))
+        columns.append(indices)
+        values.append(data)
+    if not rows:
+        return matrix
+    return sparse.csr_matrix(
+        (numpy.concatenate(values),
+         (numpy.concatenate(rows), numpy.concatenate(columns))),
+        shape=matrix.shape
+    )
+
+
+@transaction.atomic
+def save(recommendations, batch_size=2000):
+    """Заменить все рекомендации новыми; возвращает число пользователей"""
+    AuthorRecommendation.objects.all().delete()
+    return Writer(batch_size, use_copy=False).write(
+        AuthorRecommendation,
+        (AuthorRecommendation(user_id=user_id, authors=authors)
+         for user_id, authors in recommendations)
+    )
+
+
+def popular():
+    """Самые популярные авторы: рекомендации для пользователей без
+    подписок и тех, кому расчет ничего не нашел"""
+    authors = cache.get(POPULAR_KEY)
+    if authors is None:
+        authors = list(
+            User.objects.filter(recipe_count__gt=0)
+            .order_by('-followers_count', 'id')
+            .values_list('id', flat=True)[:settings.RECOMMENDATIONS_TOP * 2]
+        )
+        cache.set(POPULAR_KEY, authors, settings.RECOMMENDATION_POPULAR_TTL)
+    return authors
+
+
+def for_user(user):
+    """id рекомендованных авторов без тех, на кого пользователь уже
+    подписан после расчета"""
+    stored = (AuthorRecommendation.objects.filter(user=user)
+              .values_list('authors', flat=True).first())
+    candidates = [author for author, _ in stored or ()] or popular()
+    followed = set(Follow.objects.filter(
+        user=user, author_id__in=candidates
+    ).values_list('author_id', flat=True))
+    followed.add(user.pk)
+    return [author for author in candidates
+            if author not in followed][:settings.RECOMMENDATIONS_TOP]
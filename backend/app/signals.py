@@ -0,0 +1,169 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from users.models import User
+
+from . import (catalogue, facets, feed, fragments, popularity, storage, sync,
+               thumbnails)
+from .models import (Favorites, Follow, Ingredient, Recipe, ShopingCart, Tag,
+                     Tombstone)
+
+# Поля автора, которые входят в представление рецепта (app.fragments)
+AUTHOR_PUBLIC_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Favorites)
+def favorite_added(sender, instance, created, **kwargs):
+    facets.invalidate(instance.user_id)
+    if created:
+        popularity.register(instance.recipe_id,
+                            settings.TRENDING_FAVORITE_WEIGHT,
+                            instance.added_at,
+                            favorite=True)
+
+
+@receiver(post_delete, sender=Favorites)
+def favorite_removed(sender, instance, **kwargs):
+    facets.invalidate(instance.user_id)
+    sync.record_deletion(Tombstone.FAVORITE, instance.recipe_id,
+                         instance.user_id)
+    popularity.unregister(instance.recipe_id,
+                          settings.TRENDING_FAVORITE_WEIGHT,
+                          instance.added_at,
+                          favorite=True)
+
+
+@receiver(post_save, sender=ShopingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    facets.invalidate(instance.user_id)
+    if created:
+        popularity.register(instance.recipe_id,
+                            settings.TRENDING_SHOPPING_CART_WEIGHT,
+                            instance.added_at)
+
+
+@receiver(post_delete, sender=ShopingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    facets.invalidate(instance.user_id)
+    sync.record_deletion(Tombstone.SHOPPING_CART, instance.recipe_id,
+                         instance.user_id)
+    popularity.unregister(instance.recipe_id,
+                          settings.TRENDING_SHOPPING_CART_WEIGHT,
+                          instance.added_at)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        feed.publish(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_loaded(sender, instance, **kwargs):
+    instance._stored_image = (
+        Recipe.objects.filter(pk=instance.pk)
+        .values_list('image', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    old, new = instance._stored_image, instance.image.name
+    if old != new:
+        storage.retain(new)
+        storage.release(old)
+        if new:
+            thumbnails.schedule_on_commit(new)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    storage.release(instance.image.name)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    sync.record_deletion(Tombstone.RECIPE, instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    facets.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def recipe_parts_changed(sender, **kwargs):
+    fragments.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    catalogue.invalidate()
+
+
+@receiver(pre_save, sender=User)
+def author_loaded(sender, instance, update_fields=None, **kwargs):
+    instance._stored_public = None
+    if instance.pk and (update_fields is None
+                        or set(update_fields) & set(AUTHOR_PUBLIC_FIELDS)):
+        instance._stored_public = (
+            User.objects.filter(pk=instance.pk)
+            .values_list(*AUTHOR_PUBLIC_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_public', None)
+    current = tuple(getattr(instance, name) for name in AUTHOR_PUBLIC_FIELDS)
+    if stored is not None and stored != current:
+        fragments.touch(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1
+        )
+        author = User.objects.only('followers_count').get(
+            pk=instance.author_id
+        )
+        feed.follow(instance.user_id, author)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    sync.record_deletion(Tombstone.FOLLOW, instance.author_id,
+                         instance.user_id)
+    User.objects.filter(pk=instance.author_id).update(
+        followers_count=F('followers_count') - 1
+    )
+    feed.unfollow(instance.user_id, instance.author_id)
+    author = User.objects.filter(pk=instance.author_id).only(
+        'followers_count'
+    ).first()
+    if author and author.followers_count == settings.FEED_FANOUT_LIMIT:
+        feed.backfill(author)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action.startswith('post_'):
+        facets.invalidate()
+        if not reverse:
+            fragments.touch(Recipe.objects.filter(pk=instance.pk))
+        elif pk_set:
+            fragments.touch(Recipe.objects.filter(pk__in=pk_set))
+        else:
+            fragments.invalidate()
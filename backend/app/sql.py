@@ -0,0 +1,14 @@
+"""Общие выражения ORM для денормализованных счетчиков"""
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field, key='pk'):
+    """Число строк model, у которых field ссылается на текущую строку
+    внешнего запроса (ее поле key); 0 вместо NULL, если таких нет"""
+    return Coalesce(
+        Subquery(model.objects.filter(**{field: OuterRef(key)})
+                 .order_by().values(field)
+                 .annotate(count=Count('pk')).values('count')),
+        0
+    )
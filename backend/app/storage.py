@@ -0,0 +1,141 @@
+"""Хранилище, которое называет файлы по хэшу содержимого.
+
+Одинаковые файлы хранятся один раз, а содержимое файла с данным
+именем никогда не меняется, поэтому nginx отдает их с
+`Cache-Control: immutable`. Число ссылок на файл учитывается
+в MediaBlob; файл, на который больше никто не ссылается, удаляется
+в фоне после коммита транзакции, а загруженный менее
+MEDIA_GC_GRACE_HOURS часов назад — позже, командой gc_media. Она же
+пересчитывает ссылки по рецептам (recount), если счетчик разошелся."""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MediaBlob, Recipe
+from .sql import count_related
+from .thumbnails import thumbnail_name
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1,
+                               thread_name_prefix='media-delete')
+
+
+def hashed_name(prefix, digest, extension):
+    return f'{prefix}{digest[:2]}/{digest}{extension.lower()}'
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы из CONTENT_ADDRESSED_PREFIXES сохраняются как
+    <prefix>ab/<sha256>.<ext>; повторная загрузка возвращает
+    уже сохраненный файл"""
+
+    def save(self, name, content, max_length=None):
+        prefix = next((prefix for prefix in
+                       settings.CONTENT_ADDRESSED_PREFIXES
+                       if name.startswith(prefix)), None)
+        if prefix is None:
+            return super().save(name, content, max_length)
+        name = hashed_name(prefix, file_digest(content),
+                           os.path.splitext(name)[1])
+        with transaction.atomic():
+            # Блокировка строки MediaBlob не дает delete_unused удалить
+            # файл между проверкой exists и сохранением ссылки на него
+            blob, created = (MediaBlob.objects.select_for_update()
+                             .get_or_create(name=name))
+            if not created:
+                blob.save(update_fields=['uploaded_at'])
+            if self.exists(name):
+                return name
+            saved = super().save(name, content, max_length)
+        if saved != name:
+            # Тот же файл параллельно сохранил другой процесс
+            self.delete(saved)
+        return name
+
+
+def retain(name, count=1):
+    if not name:
+        return
+    if MediaBlob.objects.filter(name=name).update(refs=F('refs') + count):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, refs=count)
+    except IntegrityError:
+        MediaBlob.objects.filter(name=name).update(refs=F('refs') + count)
+
+
+def release(name):
+    if not name:
+        return
+    MediaBlob.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    transaction.on_commit(lambda: _executor.submit(_delete_in_background,
+                                                   name))
+
+
+def recount():
+    """Заменить refs числом рецептов с этим изображением. Счетчик
+    расходится после сбоя между сохранением файла и retain или
+    загрузки в обход сигналов; возвращает число исправленных строк"""
+    actual = count_related(Recipe, 'image', key='name')
+    return (MediaBlob.objects.annotate(actual=actual)
+            .exclude(refs=F('actual')).update(refs=actual))
+
+
+def delete_file(name):
+    for path in (name, thumbnail_name(name)):
+        try:
+            default_storage.delete(path)
+        except OSError:
+            logger.exception('Не удалось удалить %s', path)
+
+
+def delete_unused(name, grace_hours=None):
+    """Удалить файл, если на него не ссылается ни один рецепт.
+
+    Строка MediaBlob блокируется, а число ссылок проверяется заново:
+    параллельная загрузка того же содержимого ждет удаления или
+    отменяет его. Файлы, загруженные позже чем grace_hours часов назад,
+    не удаляются: ссылку на них рецепт может сохранить уже после
+    загрузки. Возвращает True, если файл удален.
+    """
+    if grace_hours is None:
+        grace_hours = settings.MEDIA_GC_GRACE_HOURS
+    deadline = timezone.now() - timedelta(hours=grace_hours)
+    with transaction.atomic():
+        blob, created = (MediaBlob.objects.select_for_update()
+                         .get_or_create(name=name))
+        if not created and (blob.refs or blob.uploaded_at > deadline):
+            return False
+        if Recipe.objects.filter(image=name).exists():
+            return False
+        blob.delete()
+        delete_file(name)
+    return True
+
+
+def _delete_in_background(name):
+    try:
+        delete_unused(name)
+    finally:
+        connection.close()
@@ -0,0 +1,109 @@
+"""Синхронизация клиентов по изменениям.
+
+Изменения — это строки, созданные или измененные после токена (поле
+времени выборки), и отметки Tombstone об удаленных строках. Обе выборки
+упорядочены по (время, источник, id) и сливаются в одну; токен хранит
+позицию последнего отданного изменения, поэтому повторный запрос с ним
+продолжает ровно с того же места.
+
+Изменения моложе SYNC_SETTLE_SECONDS не отдаются: транзакция, начатая
+раньше, может закоммитить строку с более ранним временем, и токен ее бы
+уже пропустил. Отметки об удалении хранятся SYNC_TOMBSTONE_DAYS дней;
+клиент с более старым токеном получает все заново с признаком reset.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cursors
+from .models import Tombstone
+
+UPSERT, DELETE, END = 0, 1, 2
+
+
+def encode_token(position):
+    return cursors.encode(*position)
+
+
+def decode_token(token):
+    """Разобрать токен; для некорректного значения возвращает None"""
+    position = cursors.decode(token, 2)
+    if position is None or position[1] not in (UPSERT, DELETE, END):
+        return None
+    return position
+
+
+def _after(position, source, time_field):
+    if position is None:
+        return Q()
+    when, position_source, pk = position
+    if source < position_source:
+        return Q(**{f'{time_field}__gt': when})
+    if source > position_source:
+        return Q(**{f'{time_field}__gte': when})
+    return (Q(**{f'{time_field}__gt': when})
+            | Q(**{time_field: when, 'id__gt': pk}))
+
+
+def record_deletion(kind, object_id, user_id=None):
+    Tombstone.objects.create(kind=kind, object_id=object_id,
+                             user_id=user_id)
+
+
+def prune(now=None):
+    """Удалить отметки старше SYNC_TOMBSTONE_DAYS; возвращает их число"""
+    return Tombstone.objects.filter(
+        deleted_at__lt=_horizon(now)
+    ).delete()[0]
+
+
+def _horizon(now=None):
+    return ((now or timezone.now())
+            - timedelta(days=settings.SYNC_TOMBSTONE_DAYS))
+
+
+def changes(queryset, time_field, tombstones, position=None, size=500):
+    """Изменения после позиции position.
+
+    Возвращает id измененных строк queryset, object_id удаленных, токен
+    следующего запроса, признак того, что изменений больше size, и
+    признак reset: позиция старше хранимых отметок, отдано все с начала.
+    Клиент применяет сначала удаления, затем измененные строки.
+    """
+    now = timezone.now()
+    reset = position is not None and position[0] < _horizon(now)
+    if reset:
+        position = None
+    bound = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    if position is not None and position[0] > bound:
+        bound = position[0]
+    rows = (
+        queryset.filter(_after(position, UPSERT, time_field),
+                        **{f'{time_field}__lte': bound})
+        .order_by(time_field, 'id')
+        .values_list(time_field, 'id')[:size + 1]
+    )
+    deletions = (
+        tombstones.filter(_after(position, DELETE, 'deleted_at'),
+                          deleted_at__lte=bound)
+        .order_by('deleted_at', 'id')
+        .values_list('deleted_at', 'id', 'object_id')[:size + 1]
+    )
+    merged = sorted(
+        [(when, UPSERT, pk, pk) for when, pk in rows]
+        + [(when, DELETE, pk, object_id)
+           for when, pk, object_id in deletions]
+    )
+    has_more = len(merged) > size
+    merged = merged[:size]
+    if has_more:
+        position = merged[-1][:3]
+    else:
+        position = (bound, END, 0)
+    changed = [pk for _, source, pk, _ in merged if source == UPSERT]
+    deleted = list(dict.fromkeys(
+        object_id for _, source, _, object_id in merged if source == DELETE
+    ))
+    return changed, deleted, encode_token(position), has_more, reset
@@ -0,0 +1,79 @@
+"""Уменьшенные копии изображений рецептов для коротких списков.
+
+Копия строится в фоновом потоке после сохранения рецепта с новым
+изображением. Пока ее нет (или изображение загружено в обход модели,
+например import_recipes), списки отдают исходное изображение, а
+построение копии ставится в очередь.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+THUMBNAILS_DIR = 'app/thumbnails/'
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnails')
+_lock = threading.Lock()
+_pending = set()
+
+
+def thumbnail_name(name):
+    return THUMBNAILS_DIR + os.path.basename(name)
+
+
+def make_thumbnail(name):
+    from PIL import Image
+
+    with default_storage.open(name, 'rb') as source:
+        picture = Image.open(source)
+        picture.thumbnail(settings.THUMBNAIL_SIZE)
+        buffer = io.BytesIO()
+        picture.save(buffer, format=picture.format or 'PNG')
+    return default_storage.save(thumbnail_name(name),
+                                ContentFile(buffer.getvalue()))
+
+
+def _generate(name):
+    try:
+        if not default_storage.exists(thumbnail_name(name)):
+            make_thumbnail(name)
+    except (OSError, ValueError):
+        logger.exception('Не удалось построить копию %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def schedule(name):
+    """Построить копию в фоне; повторные вызовы до ее готовности
+    ничего не делают"""
+    if not name:
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _executor.submit(_generate, name)
+
+
+def schedule_on_commit(name):
+    transaction.on_commit(lambda: schedule(name))
+
+
+def thumbnail_url(image):
+    """Адрес уменьшенной копии или, пока ее нет, исходного изображения"""
+    if not image:
+        return None
+    name = thumbnail_name(image.name)
+    if default_storage.exists(name):
+        return default_storage.url(name)
+    schedule(image.name)
+    return image.url
@@ -0,0 +1,107 @@
+"""Сжатие ответов gzip и br.
+
+CompressionMiddleware сжимает JSON-ответы API не короче
+COMPRESS_MIN_SIZE байт. HTML-страницы (админка) и ответы, выставляющие
+CSRF-cookie, не сжимаются: секрет рядом с отраженным вводом в сжатом
+ответе можно подобрать по его длине (BREACH). Ответы из кэша
+собираются через cached_response: в кэше лежит уже сжатое тело для
+каждого кодирования, и повторное обращение не сжимает те же байты
+заново.
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+COMPRESSIBLE = re.compile(r'^application/json')
+COMPRESS_PATH_PREFIX = '/api/'
+
+_brotli = None
+
+
+def brotli():
+    """Модуль brotli или False, если он не установлен"""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli as module
+        except ImportError:
+            module = False
+        _brotli = module
+    return _brotli
+
+
+def negotiate(request):
+    """Лучшее из поддерживаемых клиентом кодирований или None"""
+    accepted = {
+        part.split(';')[0].strip(): 'q=0' not in part.replace(' ', '')
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+    if accepted.get('br') and brotli():
+        return 'br'
+    if accepted.get('gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli().compress(body,
+                                 quality=settings.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESS_GZIP_LEVEL,
+                         mtime=0)
+
+
+def cached_response(request, key, render, timeout,
+                    content_type='application/json'):
+    """Ответ с телом render() из кэша; тело хранится сжатым тем
+    кодированием, которое поддерживает клиент"""
+    encoding = negotiate(request)
+    cache_key = f'{key}:{encoding or "identity"}'
+    entry = cache.get(cache_key)
+    if entry is None:
+        body = render()
+        if encoding and len(body) >= settings.COMPRESS_MIN_SIZE:
+            entry = (compress(body, encoding), encoding)
+        else:
+            entry = (body, None)
+        cache.set(cache_key, entry, timeout)
+    body, used = entry
+    response = HttpResponse(body, content_type=content_type)
+    if used:
+        response['Content-Encoding'] = used
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class CompressionMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming
+                or not request.path.startswith(COMPRESS_PATH_PREFIX)
+                or response.has_header('Content-Encoding')
+                or not COMPRESSIBLE.match(response.get('Content-Type', ''))
+                or settings.CSRF_COOKIE_NAME in response.cookies):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request)
+        if not encoding or len(response.content) < settings.COMPRESS_MIN_SIZE:
+            return response
+        body = compress(response.content, encoding)
+        if len(body) >= len(response.content):
+            return response
+        response.content = body
+        response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(body))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # Сжатое представление побайтно отличается от исходного
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,93 @@
+"""Чтение с реплик, запись в основную базу.
+
+ReplicaRouter направляет чтение на реплики только внутри запросов,
+которые ReplicaMiddleware пометил как читающие; команды, фоновые
+потоки и транзакции работают с основной базой. После записи
+клиент DB_STICKY_SECONDS секунд читает из основной базы, чтобы видеть
+свои изменения, пока реплики догоняют: браузер получает короткую
+cookie DB_STICKY_COOKIE, а для клиентов без cookie отметка хранится в
+кэше state по токену или адресу клиента. Токены и сессии всегда
+читаются из основной базы: иначе запрос сразу после входа мог бы не
+найти на реплике только что выданный токен.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.throttling import BaseThrottle
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+PRIMARY_APPS = {'authtoken', 'sessions'}
+
+_target = ContextVar('db_target', default=PRIMARY)
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES
+            if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaRouter:
+
+    def __init__(self):
+        self.replicas = replicas()
+
+    def db_for_read(self, model, **hints):
+        if (not self.replicas or _target.get() != REPLICA
+                or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        _target.set(PRIMARY)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def client_key(request):
+    """Ключ отметки о записи: токен, сессия или адрес клиента с учетом
+    NUM_PROXIES, как в ограничении частоты запросов"""
+    identity = (request.META.get('HTTP_AUTHORIZATION')
+                or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+                or BaseThrottle().get_ident(request) or '')
+    return 'db-sticky:' + hashlib.sha1(identity.encode()).hexdigest()
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплик для безопасных запросов клиента,
+    который давно ничего не записывал"""
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = client_key(request)
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS')
+        sticky = (settings.DB_STICKY_COOKIE in request.COOKIES
+                  or caches['state'].get(key))
+        target = _target.set(REPLICA if safe and not sticky else PRIMARY)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            written = not safe or _wrote.get()
+        finally:
+            _target.reset(target)
+            _wrote.reset(wrote)
+        if written:
+            caches['state'].set(key, True, settings.DB_STICKY_SECONDS)
+            response.set_cookie(settings.DB_STICKY_COOKIE, '1',
+                                max_age=settings.DB_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
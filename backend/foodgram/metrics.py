@@ -0,0 +1,239 @@
+"""Метрики запросов в формате Prometheus.
+
+MetricsMiddleware собирает для каждого маршрута время ответа, число и
+время SQL-запросов и размер ответа в гистограммы внутри процесса.
+Раз в METRICS_FLUSH_INTERVAL секунд процесс сохраняет свои значения в
+файл METRICS_DIR/<pid>.json, а представление metrics суммирует файлы
+всех воркеров, поэтому /metrics показывает данные по всему серверу.
+Файлы завершившихся процессов удаляются при сборе, а при запуске
+gunicorn (gunicorn.conf.py) каталог очищается целиком.
+
+/metrics отвечает только адресам из METRICS_ALLOWED_IPS или запросу с
+заголовком Authorization: Bearer METRICS_TOKEN.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .sql import instrument
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Время обработки запроса', SECONDS),
+    'foodgram_request_sql_queries': (
+        'Число SQL-запросов за запрос', QUERIES),
+    'foodgram_request_sql_duration_seconds': (
+        'Суммарное время SQL-запросов за запрос', SECONDS),
+    'foodgram_response_size_bytes': (
+        'Размер тела ответа', BYTES),
+}
+RESPONSES = 'foodgram_responses_total'
+
+
+class QueryStats:
+    """Обертка execute_wrapper, считающая число и время запросов"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.responses = {}
+        self.flushed = time.monotonic()
+
+    def observe(self, labels, status, values):
+        with self.lock:
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                key = (name,) + labels
+                data = self.histograms.setdefault(
+                    key, [[0] * len(buckets), 0.0, 0]
+                )
+                for index, bound in enumerate(buckets):
+                    if value <= bound:
+                        data[0][index] += 1
+                        break
+                data[1] += value
+                data[2] += 1
+            key = labels + (str(status),)
+            self.responses[key] = self.responses.get(key, 0) + 1
+        if time.monotonic() - self.flushed > settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.flushed = time.monotonic()
+            data = {
+                'histograms': [list(key) + [value]
+                               for key, value in self.histograms.items()],
+                'responses': [list(key) + [value]
+                              for key, value in self.responses.items()],
+            }
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=settings.METRICS_DIR,
+                                    suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+        os.replace(path, os.path.join(settings.METRICS_DIR,
+                                      f'{os.getpid()}.json'))
+
+
+registry = Registry()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def clear():
+    """Удалить значения всех процессов, например прошлого запуска"""
+    if not os.path.isdir(settings.METRICS_DIR):
+        return
+    for entry in os.scandir(settings.METRICS_DIR):
+        if entry.name.endswith(('.json', '.tmp')):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def collect():
+    """Суммировать сохраненные значения живых процессов; файлы
+    завершившихся удаляются"""
+    histograms, responses = {}, {}
+    for entry in os.scandir(settings.METRICS_DIR):
+        if not entry.name.endswith('.json'):
+            continue
+        pid = entry.name[:-len('.json')]
+        if pid.isdigit() and not _alive(int(pid)):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(entry.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for *key, (buckets, total, count) in data['histograms']:
+            merged = histograms.setdefault(
+                tuple(key), [[0] * len(buckets), 0.0, 0]
+            )
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+        for *key, count in data['responses']:
+            responses[tuple(key)] = responses.get(tuple(key), 0) + count
+    return histograms, responses
+
+
+def _labels(route, method, **extra):
+    labels = {'route': route, 'method': method, **extra}
+    return ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in labels.items()
+    )
+
+
+def render():
+    histograms, responses = collect()
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, route, method), (counts, total, count) in sorted(
+                histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, value in zip(buckets, counts):
+                cumulative += value
+                labels = _labels(route, method, le=bound)
+                lines.append(f'{name}_bucket{{{labels}}} {cumulative}')
+            labels = _labels(route, method, le='+Inf')
+            lines.append(f'{name}_bucket{{{labels}}} {count}')
+            labels = _labels(route, method)
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+    lines.append(f'# HELP {RESPONSES} Число ответов по кодам статуса')
+    lines.append(f'# TYPE {RESPONSES} counter')
+    for (route, method, status), count in sorted(responses.items()):
+        labels = _labels(route, method, status=status)
+        lines.append(f'{RESPONSES}{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def allowed(request):
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    return bool(settings.METRICS_TOKEN) and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        f'Bearer {settings.METRICS_TOKEN}'
+    )
+
+
+def metrics(request):
+    if not allowed(request):
+        return HttpResponseForbidden()
+    registry.flush()
+    return HttpResponse(render(),
+                        content_type='text/plain; version=0.0.4')
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryStats()
+        start = time.perf_counter()
+        with instrument(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        if match is None:
+            route = 'unresolved'
+        else:
+            route = match.url_name or match.route
+        if response.streaming:
+            size = int(response.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+        registry.observe((route, request.method), response.status_code, {
+            'foodgram_request_duration_seconds': duration,
+            'foodgram_request_sql_queries': queries.count,
+            'foodgram_request_sql_duration_seconds': queries.duration,
+            'foodgram_response_size_bytes': size,
+        })
+        return response
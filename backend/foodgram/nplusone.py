@@ -0,0 +1,77 @@
+"""Поиск N+1 запросов.
+
+Detector приводит каждый SQL-запрос к шаблону и считает повторы в
+пределах одного запроса к API. Шаблон, выполненный NPLUSONE_THRESHOLD
+раз и больше, считается N+1: для него запоминается поле сериализатора
+или строка кода, из которой он выполняется. Проверка включается
+настройкой NPLUSONE_ENABLED (middleware) или в тестах через
+detect_n_plus_one; в строгом режиме найденные N+1 приводят к ошибке.
+"""
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .sql import find_origin, instrument, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class Detector:
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.counts = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        template = normalize_sql(sql)
+        self.counts[template] += 1
+        if self.counts[template] == self.threshold:
+            self.origins[template] = find_origin()
+        return execute(sql, params, many, context)
+
+    @property
+    def problems(self):
+        return [(self.origins[template], count, template)
+                for template, count in self.counts.most_common()
+                if count >= self.threshold]
+
+    def report(self):
+        return '\n'.join(f'{origin}: {count} запросов {template}'
+                         for origin, count, template in self.problems)
+
+
+@contextmanager
+def detect_n_plus_one(threshold=None, strict=True):
+    """Контекстный менеджер для тестов: ошибка при найденных N+1"""
+    detector = Detector(threshold)
+    with instrument(detector):
+        yield detector
+    if strict and detector.problems:
+        raise NPlusOneError('Найдены N+1 запросы:\n' + detector.report())
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        detector = Detector()
+        with instrument(detector):
+            response = self.get_response(request)
+        if detector.problems:
+            message = (f'N+1 в {request.method} {request.path}:\n'
+                       + detector.report())
+            if settings.NPLUSONE_STRICT:
+                raise NPlusOneError(message)
+            logger.warning(message)
+            response['X-NPlusOne'] = str(len(detector.problems))
+        return response
@@ -0,0 +1,232 @@
+"""Профилирование отдельных запросов в рабочем окружении.
+
+Сотрудник (is_staff) добавляет к запросу ?profile=1 или заголовок
+X-Profile: 1 и вместо ответа получает отчет в JSON: время запроса,
+функции по cProfile, SQL-запросы с временем и местом вызова и пик
+памяти по tracemalloc. Значение prof вместо 1 возвращает файл pstats
+для snakeviz или python -m pstats.
+
+Кроме того, доля PROFILE_SAMPLE_RATE всех запросов профилируется без
+изменения ответа: отчет и файл pstats пишутся в PROFILE_DIR.
+"""
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse
+from django.utils.text import slugify
+
+from .sql import find_origin, instrument, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('1', 'json', 'prof')
+
+
+class ProfilerBusyError(Exception):
+    """В этом потоке уже работает другой профилировщик"""
+
+
+class QueryLog:
+    """Обертка execute_wrapper: время и место вызова каждого запроса"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        origin = find_origin()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (normalize_sql(sql), time.perf_counter() - start, origin)
+            )
+
+    def summary(self, top):
+        templates = {}
+        for template, duration, origin in self.queries:
+            entry = templates.setdefault(
+                template, {'sql': template, 'count': 0, 'ms': 0.0,
+                           'origins': set()}
+            )
+            entry['count'] += 1
+            entry['ms'] += duration * 1000
+            entry['origins'].add(origin)
+        slowest = sorted(templates.values(), key=lambda entry: entry['ms'],
+                         reverse=True)[:top]
+        return {
+            'count': len(self.queries),
+            'ms': round(sum(duration for _, duration, _ in self.queries)
+                        * 1000, 2),
+            'templates': [
+                {**entry, 'ms': round(entry['ms'], 2),
+                 'origins': sorted(entry['origins'])}
+                for entry in slowest
+            ],
+        }
+
+
+class Profile:
+    """Профиль одного запроса: cProfile, SQL и, по желанию, память"""
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.profiler = cProfile.Profile()
+        self.queries = QueryLog()
+
+    def run(self, request, get_response):
+        try:
+            self.profiler.enable()
+        except ValueError:
+            raise ProfilerBusyError
+        started_tracing = False
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            with instrument(self.queries):
+                response = get_response(request)
+        finally:
+            self.profiler.disable()
+            self.duration = time.perf_counter() - start
+            self.peak = None
+            if self.memory:
+                self.peak = tracemalloc.get_traced_memory()[1] - base
+                if started_tracing:
+                    tracemalloc.stop()
+        return response
+
+    def functions(self, top):
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3],
+                      reverse=True)[:top]
+        return [
+            {'function': f'{os.path.relpath(filename, settings.BASE_DIR)}'
+                         f':{line}({name})'
+             if filename.startswith(str(settings.BASE_DIR))
+             else f'{filename}:{line}({name})',
+             'calls': calls, 'self_ms': round(own * 1000, 2),
+             'cumulative_ms': round(cumulative * 1000, 2)}
+            for (filename, line, name), (_, calls, own, cumulative, _)
+            in rows
+        ]
+
+    def report(self, request, response):
+        top = settings.PROFILE_TOP
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'ms': round(self.duration * 1000, 2),
+            'sql': self.queries.summary(top),
+            'memory_peak_kb': (None if self.peak is None
+                               else round(self.peak / 1024, 1)),
+            'functions': self.functions(top),
+        }
+
+    def pstats_bytes(self):
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+
+def file_name(request):
+    return slugify(request.path.replace('/', '-')).strip('-') or 'root'
+
+
+def requested_format(request):
+    value = (request.GET.get('profile')
+             or request.META.get('HTTP_X_PROFILE'))
+    return value if value in FORMATS else None
+
+
+def is_staff(request):
+    """Сотрудник по токену API; request.user здесь есть, только если
+    middleware стоит после AuthenticationMiddleware"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result) and result[0].is_staff
+
+
+class ProfilingMiddleware:
+    """Ставится первым, чтобы профиль включал остальные middleware"""
+
+    def __init__(self, get_response):
+        if not (settings.PROFILE_ENABLED or settings.PROFILE_SAMPLE_RATE):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        fmt = settings.PROFILE_ENABLED and requested_format(request)
+        if fmt and is_staff(request):
+            return self.on_demand(request, fmt)
+        if (settings.PROFILE_SAMPLE_RATE
+                and random.random() < settings.PROFILE_SAMPLE_RATE):
+            return self.sampled(request)
+        return self.get_response(request)
+
+    def profile(self, request, memory):
+        profile = Profile(memory=memory)
+        try:
+            response = profile.run(request, self.get_response)
+        except ProfilerBusyError:
+            return None, self.get_response(request)
+        return profile, response
+
+    def on_demand(self, request, fmt):
+        profile, response = self.profile(request, memory=True)
+        if profile is None:
+            return response
+        if fmt == 'prof':
+            name = file_name(request)
+            result = HttpResponse(profile.pstats_bytes(),
+                                  content_type='application/octet-stream')
+            result['Content-Disposition'] = (
+                f'attachment; filename="{name}.prof"'
+            )
+            return result
+        return JsonResponse(profile.report(request, response),
+                            json_dumps_params={'ensure_ascii': False})
+
+    def sampled(self, request):
+        profile, response = self.profile(
+            request, memory=settings.PROFILE_SAMPLE_MEMORY
+        )
+        if profile is None:
+            return response
+        name = '{}-{}-{}-{}'.format(
+            time.strftime('%Y%m%dT%H%M%S'), request.method.lower(),
+            file_name(request)[:80], os.getpid()
+        )
+        path = os.path.join(settings.PROFILE_DIR, name)
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            with open(path + '.json', 'w') as file:
+                json.dump(profile.report(request, response), file,
+                          ensure_ascii=False, indent=1)
+            with open(path + '.prof', 'wb') as file:
+                file.write(profile.pstats_bytes())
+        except OSError:
+            logger.exception('Не удалось сохранить профиль %s', path)
+        return response
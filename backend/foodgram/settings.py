@@ -32,6 +32,11 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'foodgram.profiling.ProfilingMiddleware',
+    'foodgram.metrics.MetricsMiddleware',
+    'foodgram.compression.CompressionMiddleware',
+    'foodgram.db_router.ReplicaMiddleware',
+    'api.throttling.RateLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +44,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.nplusone.NPlusOneMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -72,6 +78,57 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения (foodgram.db_router): через запятую адреса
+# host[:port], для SQLite — пути к файлам баз
+for number, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = dict(DATABASES['default'])
+    if 'sqlite3' in DATABASES['default']['ENGINE']:
+        DATABASES[f'replica{number}']['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        DATABASES[f'replica{number}']['HOST'] = host
+        DATABASES[f'replica{number}']['PORT'] = port or '5432'
+    DATABASES[f'replica{number}']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной базы
+DB_STICKY_SECONDS = int(os.getenv('DB_STICKY_SECONDS', 10))
+DB_STICKY_COOKIE = 'db_primary'
+
+# Общий для всех воркеров кэш. Файловый кэш — только для разработки:
+# add в нем не атомарен между процессами, а после MAX_ENTRIES записей
+# он удаляет случайную треть. В docker-compose используется memcached.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '/tmp/foodgram-cache')
+CACHE_MEMCACHED = 'memcached' in CACHE_BACKEND
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'TIMEOUT': 300,
+        # memcached получает OPTIONS как параметры клиента
+        'OPTIONS': {} if CACHE_MEMCACHED else {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+    # Состояние клиентов: привязка к основной базе (foodgram.db_router)
+    # и корзины ограничения частоты (api.throttling). Отдельный кэш,
+    # чтобы фрагменты и выборки не вытесняли эти записи
+    'state': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'STATE_CACHE_LOCATION',
+            CACHE_LOCATION if CACHE_MEMCACHED else '/tmp/foodgram-state'
+        ),
+        'KEY_PREFIX': 'state',
+        'TIMEOUT': 300,
+        'OPTIONS': {} if CACHE_MEMCACHED else {'MAX_ENTRIES': 1000000},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -97,6 +154,21 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 6,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    # Адрес анонимного клиента берется из X-Forwarded-For, который
+    # выставляет nginx; без прокси задается NUM_PROXIES=0
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+}
+
+# Корзины api.throttling.TokenBucketThrottle: (емкость в жетонах,
+# пополнение жетонов в секунду)
+THROTTLE_BUCKETS = {
+    'user': (int(os.getenv('THROTTLE_USER_CAPACITY', 60)),
+             float(os.getenv('THROTTLE_USER_RATE', 2))),
+    'anon': (int(os.getenv('THROTTLE_ANON_CAPACITY', 30)),
+             float(os.getenv('THROTTLE_ANON_RATE', 1))),
 }
 
 
@@ -119,3 +191,87 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CSV_FILES_DIR = "../data"
+
+# Рейтинг популярности рецептов (app.popularity)
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 72))
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_SHOPPING_CART_WEIGHT = 0.5
+TRENDING_EPOCH = os.getenv('TRENDING_EPOCH', '2023-01-01')
+
+# Лента подписок (app.feed): рецепты авторов, у которых больше
+# FEED_FANOUT_LIMIT подписчиков, не рассылаются, а читаются при запросе
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+FEED_BACKFILL = 500
+
+# Метрики запросов (foodgram.metrics): каталог, общий для всех воркеров
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/foodgram-metrics')
+METRICS_FLUSH_INTERVAL = 5
+# Кому отвечает /metrics: адреса через запятую или Bearer-токен
+METRICS_ALLOWED_IPS = [
+    address for address
+    in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if address
+]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Поиск N+1 запросов (foodgram.nplusone), для staging и тестов
+NPLUSONE_ENABLED = os.getenv('NPLUSONE_ENABLED', '').lower() in ('1', 'true')
+NPLUSONE_STRICT = os.getenv('NPLUSONE_STRICT', '').lower() in ('1', 'true')
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+
+# Журнал медленных запросов (foodgram.slow_queries), 0 — отключен
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.1))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', '/tmp/foodgram-slow-queries.log')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Профилирование запросов (foodgram.profiling): ?profile=1 для сотрудников
+# и запись профилей доли PROFILE_SAMPLE_RATE всех запросов в PROFILE_DIR
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'true').lower() in ('1', 'true')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLE_MEMORY = False
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/foodgram-profiles')
+PROFILE_TOP = 30
+
+# Размер уменьшенных изображений рецептов (app.thumbnails)
+THUMBNAIL_SIZE = (320, 320)
+
+# Изображения рецептов хранятся под именами по хэшу содержимого (app.storage)
+DEFAULT_FILE_STORAGE = 'app.storage.ContentAddressedStorage'
+CONTENT_ADDRESSED_PREFIXES = ('app/images/',)
+# gc_media не удаляет файлы моложе этого срока: они могут быть еще
+# не сохранены в рецепте
+MEDIA_GC_GRACE_HOURS = 24
+
+# Фоновые выгрузки (app.exports): потоков в каждом процессе веб-сервера,
+# 0 — выполняет только run_export_worker
+EXPORT_WORKER_THREADS = int(os.getenv('EXPORT_WORKER_THREADS', 2))
+EXPORT_JOB_TIMEOUT = 600
+EXPORT_TTL_HOURS = 24
+# Файлы отдает nginx из internal location; без nginx — сам Django
+EXPORT_X_ACCEL = os.getenv('EXPORT_X_ACCEL', 'true').lower() in ('1', 'true')
+EXPORT_ACCEL_PREFIX = '/protected-media/'
+
+# Кэш счетчиков тегов (app.facets), секунды
+FACETS_TTL = 60
+FACETS_GLOBAL_TTL = 24 * 3600
+
+# Кэш публичной части представления рецептов (app.fragments), секунды
+RECIPE_FRAGMENT_TTL = 24 * 3600
+
+# Синхронизация клиентов по изменениям (app.sync)
+SYNC_PAGE_SIZE = 500
+SYNC_SETTLE_SECONDS = 5
+SYNC_TOMBSTONE_DAYS = 30
+
+# Рекомендации авторов по совместным подпискам (app.recommendations)
+RECOMMENDATIONS_TOP = 20
+RECOMMENDATION_NEIGHBORS = 50
+RECOMMENDATION_MIN_COMMON = 2
+RECOMMENDATION_MAX_FOLLOWS = 1000
+RECOMMENDATION_POPULAR_TTL = 3600
+
+# Сжатие ответов (foodgram.compression)
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
@@ -0,0 +1,140 @@
+"""Журнал медленных SQL-запросов.
+
+К каждому соединению с базой при создании подключается обертка,
+которая записывает запросы дольше SLOW_QUERY_MS миллисекунд: шаблон
+запроса, время, метод представления или сериализатора и строку кода.
+Для доли SLOW_QUERY_EXPLAIN_RATE записей добавляется план запроса
+(EXPLAIN без ANALYZE, запрос повторно не выполняется). Журнал — файл
+JSON Lines с ротацией, сводку по нему выводит команда slow_queries.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from .sql import find_origin, find_view, normalize_sql
+
+logger = logging.getLogger(__name__)
+journal = logging.getLogger('foodgram.slow_queries.journal')
+journal.propagate = False
+
+EXPLAINABLE = ('SELECT', 'WITH')
+
+_local = threading.local()
+
+
+class SlowQueryLogger:
+    """Обертка execute_wrapper соединения connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'busy', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= settings.SLOW_QUERY_MS:
+            _local.busy = True
+            try:
+                self.record(sql, params, many, duration)
+            finally:
+                _local.busy = False
+        return result
+
+    def record(self, sql, params, many, duration):
+        entry = {
+            'time': timezone.now().isoformat(),
+            'db': self.connection.alias,
+            'ms': round(duration, 2),
+            'sql': normalize_sql(sql),
+            'view': find_view(depth=4),
+            'origin': find_origin(depth=4),
+        }
+        if (not many
+                and sql.lstrip().upper().startswith(EXPLAINABLE)
+                and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE):
+            entry['plan'] = self.explain(sql, params)
+        journal.info(json.dumps(entry, ensure_ascii=False))
+
+    def explain(self, sql, params):
+        prefix = self.connection.ops.explain_query_prefix()
+        try:
+            # Точка сохранения: ошибка EXPLAIN не прерывает транзакцию
+            with transaction.atomic(using=self.connection.alias):
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f'{prefix} {sql}', params)
+                    rows = cursor.fetchall()
+        except DatabaseError as error:
+            return f'EXPLAIN не выполнен: {error}'
+        return '\n'.join(' '.join(str(value) for value in row)
+                         for row in rows)
+
+
+def attach(sender, connection, **kwargs):
+    if not any(isinstance(wrapper, SlowQueryLogger)
+               for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLogger(connection))
+
+
+def install():
+    """Подключить журнал, если задан порог SLOW_QUERY_MS"""
+    if settings.SLOW_QUERY_MS <= 0 or journal.handlers:
+        return
+    try:
+        handler = RotatingFileHandler(
+            settings.SLOW_QUERY_LOG,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+            encoding='utf-8', delay=True
+        )
+    except OSError:
+        logger.exception('Журнал медленных запросов недоступен')
+        return
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    journal.addHandler(handler)
+    journal.setLevel(logging.INFO)
+    connection_created.connect(attach, dispatch_uid='slow_queries')
+
+
+def read(paths):
+    """Записи журнала из файлов paths, поврежденные строки пропускаются"""
+    for path in paths:
+        try:
+            file = open(path, encoding='utf-8')
+        except OSError:
+            continue
+        with file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries):
+    """Сводка по шаблонам запросов, по убыванию суммарного времени"""
+    templates = {}
+    for entry in entries:
+        summary = templates.setdefault(entry['sql'], {
+            'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'views': {}, 'plan': None, 'last': None,
+        })
+        summary['count'] += 1
+        summary['total_ms'] += entry['ms']
+        summary['max_ms'] = max(summary['max_ms'], entry['ms'])
+        place = entry.get('view') or entry.get('origin') or 'unknown'
+        summary['views'][place] = summary['views'].get(place, 0) + 1
+        if summary['last'] is None or entry['time'] >= summary['last']:
+            summary['last'] = entry['time']
+            summary['plan'] = entry.get('plan') or summary['plan']
+    return sorted(templates.values(), key=lambda item: item['total_ms'],
+                  reverse=True)
@@ -0,0 +1,81 @@
+"""Общие инструменты для наблюдения за SQL-запросами"""
+import os
+import re
+import sys
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+_PROJECT_DIR = str(settings.BASE_DIR)
+_SKIP_DIRS = ('site-packages', 'dist-packages', os.path.dirname(__file__))
+
+
+def normalize_sql(sql):
+    """Шаблон запроса: литералы и параметры заменены на ?"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _project_frame(frame):
+    filename = frame.f_code.co_filename
+    return (filename.startswith(_PROJECT_DIR)
+            and not any(part in filename for part in _SKIP_DIRS))
+
+
+def find_origin(depth=2):
+    """Поле сериализатора или строка кода проекта, выполняющая запрос"""
+    from rest_framework.serializers import BaseSerializer
+
+    frame = sys._getframe(depth)
+    project = None
+    while frame is not None:
+        code = frame.f_code
+        if (code.co_name == 'to_representation'
+                and isinstance(frame.f_locals.get('self'), BaseSerializer)
+                and 'field' in frame.f_locals):
+            serializer = type(frame.f_locals['self']).__name__
+            return f'{serializer}.{frame.f_locals["field"].field_name}'
+        if project is None and _project_frame(frame):
+            filename = os.path.relpath(code.co_filename, _PROJECT_DIR)
+            project = f'{filename}:{frame.f_lineno} ({code.co_name})'
+        frame = frame.f_back
+    return project or 'unknown'
+
+
+@contextmanager
+def instrument(wrapper):
+    """Подключить execute_wrapper ко всем соединениям с базами"""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield wrapper
+
+
+def find_view(depth=2):
+    """Метод представления или сериализатора, из которого выполняется
+    запрос, например RecipeViewSet.get_queryset; методы из кода проекта
+    предпочтительнее унаследованных из библиотек"""
+    from django.views import View
+    from rest_framework.serializers import BaseSerializer
+
+    frame = sys._getframe(depth)
+    inherited = None
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if isinstance(owner, (View, BaseSerializer)):
+            name = f'{type(owner).__name__}.{frame.f_code.co_name}'
+            if _project_frame(frame):
+                return name
+            inherited = inherited or name
+        frame = frame.f_back
+    return inherited
@@ -0,0 +1,77 @@
+"""Замер времени запуска процесса Django.
+
+Каждый замер идет в новом интерпретаторе, чтобы не учитывать уже
+загруженные модули. Разбивка по модулям берется из python -X importtime.
+
+psycopg2 загружается при запуске воркера на любой базе: его импортирует
+rest_framework.compat через django.contrib.postgres, если драйвер
+установлен, а на PostgreSQL — еще и модуль базы. Это около 10-15 мс,
+и без драйвера рабочая база не работает, поэтому он остается в
+requirements. CI замеряет воркер и с DB_ENGINE PostgreSQL, чтобы рост
+этой части тоже не прошел незамеченным.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+TARGETS = {
+    # Воркер WSGI: приложение, маршруты и модуль базы данных, которые
+    # грузятся на первом запросе; соединение с базой не открывается
+    'wsgi': ('import foodgram.wsgi\n'
+             'from django.urls import get_resolver\n'
+             'get_resolver().url_patterns\n'
+             'from django.db import connection\n'
+             'connection.ops\n'),
+    # Любой вызов manage.py: настройка Django и список команд
+    'manage': ('import django\n'
+               'django.setup()\n'
+               'from django.core.management import get_commands\n'
+               'get_commands()\n'),
+}
+
+
+def run(target, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', TARGETS[target]]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=settings.BASE_DIR,
+                            env=dict(os.environ), capture_output=True,
+                            text=True, check=False)
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return elapsed, result.stderr
+
+
+def wall_time(target, repeat=5):
+    """Медиана времени запуска в миллисекундах"""
+    return round(statistics.median(
+        run(target)[0] for _ in range(repeat)
+    ) * 1000, 1)
+
+
+def import_times(target):
+    """{модуль: (собственное время, время с вложенными импортами)} в мс"""
+    _, output = run(target, importtime=True)
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own) / 1000, int(cumulative) / 1000)
+    return modules
+
+
+def by_package(modules):
+    """Собственное время импорта, сложенное по пакетам верхнего уровня"""
+    packages = {}
+    for name, (own, _) in modules.items():
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + own
+    return packages
@@ -3,11 +3,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('api/users/', include('users.urls')),
     path("api/auth/", include('djoser.urls.authtoken')),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,11 @@
+"""Настройки gunicorn: файл из рабочего каталога читается автоматически"""
+import os
+
+
+def on_starting(server):
+    # Метрики прошлого запуска не должны попадать в /metrics: pid новых
+    # воркеров в контейнере часто совпадают со старыми
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from foodgram import metrics
+
+    metrics.clear()
@@ -1,8 +1,10 @@
+from app.admin import LargeTableAdmin
 from django.contrib import admin
 
 from .models import User
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ('username', 'first_name', 'last_name', 'recipe_count')
+    search_fields = ('username', 'email')
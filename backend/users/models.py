@@ -12,6 +12,7 @@ class User(AbstractUser):
     first_name = models.CharField("first name", max_length=150, null=False)
     last_name = models.CharField("last name", max_length=150, null=False)
     recipe_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField("Число подписчиков", default=0)
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -78,6 +78,8 @@ class UserSerializer(serializers.ModelSerializer):
         return context
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         request = self.context.get('request')
         if request:
             current_user = request.user
@@ -1,3 +1,4 @@
+from app import recommendations
 from app.models import Follow
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
@@ -115,3 +116,23 @@ class UserViewSet(viewsets.ModelViewSet):
             },
         )
         return self.get_paginated_response(serializer.data)
+
+    @action(detail=False,
+            methods=['get'],
+            url_path='recommended',
+            permission_classes=(IsAuthenticated,),
+            )
+    def recommended(self, request):
+        """Авторы, на которых подписаны подписчики тех же авторов"""
+        ids = self.paginate_queryset(
+            recommendations.for_user(request.user)
+        )
+        authors = User.objects.in_bulk(ids)
+        page = []
+        for pk in ids:
+            if pk in authors:
+                authors[pk].subscribed = False
+                page.append(authors[pk])
+        serializer = UserSerializer(page, many=True,
+                                    context={'request': request})
+        return self.get_paginated_response(serializer.data)